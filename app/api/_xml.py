@@ -0,0 +1,104 @@
+"""
+Request parsing and response helpers shared by the IPN endpoints.
+"""
+from fastapi import HTTPException, Response, status
+from fastapi.responses import ORJSONResponse
+import re
+from xml.sax.saxutils import escape
+from typing import Dict, Any
+
+from app.utils.logger import setup_logger
+
+logger = setup_logger("api_xml")
+
+try:
+    from lxml import etree as LET
+    
+    # Shared parser; entity resolution and network access are disabled to prevent XXE,
+    # and whitespace between elements is dropped instead of kept as tail text
+    _XML_PARSER = LET.XMLParser(
+        huge_tree=False, resolve_entities=False, no_network=True, recover=False, remove_blank_text=True
+    )
+except ImportError:
+    # lxml is optional; the stdlib parser is used without it
+    import xml.etree.ElementTree as ET
+    _XML_PARSER = None
+
+# Matches an XML body without copying it to strip leading whitespace
+XML_BODY = re.compile(rb"\s*<")
+
+# XML response envelope; the status and escaped message fill the slots
+_XML_TEMPLATE = b"<COMMAND><STATUS>%s</STATUS><MESSAGE>%s</MESSAGE></COMMAND>"
+
+
+def _xml_body(status: str, message: str) -> bytes:
+    """
+    Render an XML response body.
+    
+    Messages may carry request values or error text, so bodies are not
+    cached; filling the byte template is cheaper than a cache lookup anyway.
+    
+    Args:
+        status (str): Status (SUCCESS or FAILED)
+        message (str): Response message
+    
+    Returns:
+        bytes: XML response body
+    """
+    return _XML_TEMPLATE % (status.encode("ascii"), escape(message).encode("utf-8"))
+
+def parse_xml_request(xml_content: bytes) -> Dict[str, Any]:
+    """
+    Parse XML request from Airtel.
+    
+    Args:
+        xml_content (bytes): Raw XML request body
+    
+    Returns:
+        Dict[str, Any]: Parsed data
+    """
+    try:
+        if _XML_PARSER is not None:
+            root = LET.fromstring(xml_content, _XML_PARSER)
+        else:
+            # Expat does not fetch external entities and limits entity expansion
+            root = ET.fromstring(xml_content)
+        # The documents are one flat level of short elements; building the tree
+        # in C is faster than streaming them through Python-level SAX callbacks.
+        # Skip comments and processing instructions, whose tag is not a string
+        return {child.tag: child.text for child in root if isinstance(child.tag, str)}
+    except Exception as e:
+        logger.error("Error parsing XML: %s", e)
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid XML format: {str(e)}"
+        )
+
+def create_response(format_type: str, status: str, message: str, transaction_id: str, additional_data: Dict[str, Any] = None) -> Response:
+    """
+    Create response in the specified format.
+    
+    Args:
+        format_type (str): Response format (xml or json)
+        status (str): Status (SUCCESS or FAILED)
+        message (str): Response message
+        transaction_id (str): Transaction ID
+        additional_data (Dict[str, Any], optional): Additional data to include in JSON responses
+    
+    Returns:
+        Response: XML or JSON response
+    """
+    if format_type == "xml":
+        return Response(content=_xml_body(status, message), media_type="application/xml")
+    else:
+        response = {
+            "status": status,
+            "message": message,
+            "transactionId": transaction_id
+        }
+
+        # Add additional data if provided
+        if additional_data:
+            response.update(additional_data)
+
+        return ORJSONResponse(response)
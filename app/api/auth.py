@@ -4,16 +4,16 @@ Authentication API endpoints for Airtel Kenya C2B IPN system.
 from datetime import timedelta
 from typing import Dict, Any
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import OAuth2PasswordRequestForm
 from sqlalchemy.orm import Session
 
 from app.database import get_db
 from app.utils.security import (
     authenticate_user, create_access_token, 
-    ACCESS_TOKEN_EXPIRE_MINUTES, get_current_active_user
+    ACCESS_TOKEN_EXPIRE_MINUTES
 )
-from app.models.user import User
 
 router = APIRouter()
 
@@ -35,7 +35,8 @@ async def login_for_access_token(
     Raises:
         HTTPException: If authentication fails
     """
-    user = authenticate_user(db, form_data.username, form_data.password)
+    # Password hashing and the user query block, so run them on the threadpool
+    user = await run_in_threadpool(authenticate_user, db, form_data.username, form_data.password)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -49,18 +50,19 @@ async def login_for_access_token(
     return {"access_token": access_token, "token_type": "bearer"}
 
 @router.get("/users/me", response_model=Dict[str, Any])
-async def read_users_me(current_user: User = Depends(get_current_active_user)):
+async def read_users_me(request: Request):
     """
     Get current user information.
     
     Args:
-        current_user (User): Current authenticated user
+        request (Request): FastAPI request object carrying the authenticated user
         
     Returns:
         Dict[str, Any]: User information
     """
+    current_user = request.scope["user"]
     return {
-        "username": current_user.username,
-        "email": current_user.email,
-        "is_active": current_user.is_active
+        "username": current_user["username"],
+        "email": current_user["email"],
+        "is_active": current_user["is_active"]
     }
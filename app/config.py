@@ -15,11 +15,30 @@ DB_USER = os.getenv("DB_USER", "postgres")
 DB_PASSWORD = os.getenv("DB_PASSWORD", "postgres")
 DB_URL = f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
 
+# Create tables on startup for local development; deployments run
+# `alembic upgrade head` before starting the app instead
+DEV_AUTO_CREATE = os.getenv("DEV_AUTO_CREATE", "False").lower() in ("1", "true")
+
+# Connection pool configuration (size to the number of concurrent requests per worker)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "20"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "40"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+
 # API configuration
 API_HOST = os.getenv("API_HOST", "0.0.0.0")
 API_PORT = int(os.getenv("API_PORT", "8000"))
 API_DEBUG = os.getenv("API_DEBUG", "False").lower() == "true"
 
+# Origins allowed to call the API from a browser (comma-separated)
+CORS_ORIGINS = [
+    origin.strip()
+    for origin in os.getenv("CORS_ORIGINS", "https://airtel.example,https://merchant.example").split(",")
+    if origin.strip()
+]
+
+# Profiling (requires pyinstrument; requests opt in with ?profile=1)
+PROFILING = os.getenv("PROFILING") == "1"
+
 # Airtel Kenya C2B IPN configuration
 AIRTEL_API_KEY = os.getenv("AIRTEL_API_KEY", "")
 AIRTEL_API_SECRET = os.getenv("AIRTEL_API_SECRET", "")
@@ -2,23 +2,82 @@
 Database connection utilities for the Airtel Kenya C2B IPN system.
 """
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker, scoped_session
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import QueuePool, StaticPool
+
+from app.config import DB_URL, DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_RECYCLE
+
+
+def is_memory_sqlite(url: str) -> bool:
+    """
+    Check whether a database URL points at an in-memory SQLite database.
+    
+    Args:
+        url (str): Database URL
+        
+    Returns:
+        bool: True for sqlite:// and sqlite:///:memory: URLs, including
+        file:...?mode=memory URIs
+    """
+    url = make_url(url)
+    if url.get_backend_name() != "sqlite":
+        return False
+    database = url.database or ""
+    return database in ("", ":memory:") or url.query.get("mode") == "memory"
+
+
+def engine_options(url: str) -> dict:
+    """
+    Get the create_engine options for a database URL.
+    
+    Server databases get a QueuePool sized by DB_POOL_SIZE and DB_MAX_OVERFLOW,
+    so concurrent requests each check out their own connection. Connections
+    are checked before use and recycled before server-side idle timeouts can
+    drop them, and bulk INSERTs are sent as multi-row statements of up to
+    10,000 rows. With psycopg2, other executemany calls (such as batched
+    UPDATEs) are also grouped into pages of 1,000 rows.
+    
+    In-memory SQLite databases, used by the tests, get a single connection
+    shared by all threads (StaticPool) instead, since each new connection
+    would open an empty database.
+    
+    Args:
+        url (str): Database URL
+        
+    Returns:
+        dict: Keyword arguments for create_engine
+    """
+    if is_memory_sqlite(url):
+        return {
+            "poolclass": StaticPool,
+            "connect_args": {"check_same_thread": False},
+            "insertmanyvalues_page_size": 10_000,
+        }
+    
+    options = {
+        "poolclass": QueuePool,
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_pre_ping": True,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "insertmanyvalues_page_size": 10_000,
+    }
+    if make_url(url).get_driver_name() == "psycopg2":
+        options["executemany_mode"] = "values_plus_batch"
+        options["executemany_batch_page_size"] = 1000
+    return options
 
-from app.config import DB_URL
 
 # Create SQLAlchemy engine
-engine = create_engine(DB_URL)
+engine = create_engine(DB_URL, **engine_options(DB_URL))
 
 # Create session factory
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
-# Create scoped session for thread safety
-db_session = scoped_session(SessionLocal)
-
 # Base class for all models
 Base = declarative_base()
-Base.query = db_session.query_property()
 
 
 def init_db():
@@ -34,9 +93,12 @@ def init_db():
     Base.metadata.create_all(bind=engine)
 
 
-def get_db():
+async def get_db():
     """
     Get a database session.
+    
+    Declared async so FastAPI resolves it on the event loop instead of
+    scheduling it on the threadpool; opening a session does no I/O.
     """
     db = SessionLocal()
     try:
@@ -1,14 +1,16 @@
 """
 Main application for enhanced Airtel Kenya C2B IPN system.
 """
-from fastapi import FastAPI, Depends
+from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 
 from app.api import router as api_router
 from app.api.auth import router as auth_router
+from app.config import CORS_ORIGINS, DEV_AUTO_CREATE, PROFILING
 from app.database import init_db
 from app.utils.logger import setup_logger
-from app.utils.security import get_current_active_user
+from app.utils.middleware import JWTAuthMiddleware, ProfilingMiddleware
 
 # Set up logger
 logger = setup_logger("main")
@@ -18,34 +20,44 @@ app = FastAPI(
     title="Airtel Kenya C2B IPN API",
     description="API for handling Airtel Kenya C2B Instant Payment Notifications",
     version="1.0.0",
+    default_response_class=ORJSONResponse,
     # root_path="/airtel/c2b"  # Add this line to set the base path
 )
 
+# Secure all routes except the public ones; added before CORS so that
+# CORS stays outermost and answers preflight requests itself
+app.add_middleware(
+    JWTAuthMiddleware,
+    excluded_paths={"/", "/health", "/auth/token", "/docs", "/redoc", "/openapi.json"},
+)
 
-# Add CORS middleware
+# Add CORS middleware with explicit lists; browsers cache preflights for max_age seconds
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=["*"],
+    allow_origins=CORS_ORIGINS,
     allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
+    allow_methods=["POST", "GET", "OPTIONS"],
+    allow_headers=["authorization", "content-type"],
+    max_age=600,
 )
 
+# Profile requests sent with ?profile=1; off by default to avoid sampling overhead
+if PROFILING:
+    app.add_middleware(ProfilingMiddleware)
+
 # Include API routers
 app.include_router(auth_router, prefix="/auth", tags=["authentication"])
-app.include_router(
-    api_router, 
-    prefix="/airtel/c2b", 
-    dependencies=[Depends(get_current_active_user)]  # Secure all API routes
-)
+app.include_router(api_router, prefix="/airtel/c2b")
 
-# Initialize database on startup
+# Create tables on startup only for local development; deployments apply
+# the Alembic migrations before the workers start
 @app.on_event("startup")
 async def startup_event():
-    """Initialize database on startup."""
-    logger.info("Initializing database")
-    init_db()
-    logger.info("Database initialized")
+    """Initialize database on startup when DEV_AUTO_CREATE is set."""
+    if DEV_AUTO_CREATE:
+        logger.info("Initializing database")
+        init_db()
+        logger.info("Database initialized")
 
 @app.get("/")
 async def root():
@@ -1,18 +1,21 @@
 """
 Customer model for Airtel Kenya C2B IPN system.
 """
-from sqlalchemy import Column, Integer, String, Enum, DateTime, UniqueConstraint
+from sqlalchemy import CheckConstraint, Column, Integer, String, DateTime, Index, UniqueConstraint
 from sqlalchemy.orm import relationship
+from sqlalchemy.sql import func
 import enum
-import datetime
 
 from app.database import Base
 
 
-class CustomerStatus(enum.Enum):
-    ACTIVE = "active"
-    INACTIVE = "inactive"
-    SUSPENDED = "suspended"
+class CustomerStatus(str, enum.Enum):
+    """
+    Allowed customer statuses; members compare equal to the stored strings.
+    """
+    ACTIVE = "ACTIVE"
+    INACTIVE = "INACTIVE"
+    SUSPENDED = "SUSPENDED"
 
 
 class Customer(Base):
@@ -22,20 +25,28 @@ class Customer(Base):
     __tablename__ = 'customers'
 
     id = Column(Integer, primary_key=True)
-    bill_ref = Column(String(100), nullable=False, index=True)
+    bill_ref = Column(String(100), nullable=False)
     ref_type = Column(String(50), nullable=False)
-    msisdn = Column(String(20), nullable=False, index=True)  # Customer phone number
+    msisdn = Column(String(20), nullable=False)  # Customer phone number
     full_name = Column(String(255), nullable=False)
     email = Column(String(255), nullable=True)
     id_number = Column(String(50), nullable=True)  # National ID or passport
     address = Column(String(255), nullable=True)
-    status = Column(Enum(CustomerStatus), nullable=False, default=CustomerStatus.ACTIVE)
-    created_at = Column(DateTime, nullable=False, default=datetime.datetime.utcnow)
-    updated_at = Column(DateTime, nullable=False, default=datetime.datetime.utcnow, 
-                        onupdate=datetime.datetime.utcnow)
+    status = Column(String(16), nullable=False, default=CustomerStatus.ACTIVE.value)
+    created_at = Column(DateTime, nullable=False, server_default=func.now())
+    updated_at = Column(DateTime, nullable=False, server_default=func.now(), onupdate=func.now())
     
-    # Create a unique constraint on bill_ref and ref_type
-    __table_args__ = (UniqueConstraint('bill_ref', 'ref_type', name='uix_bill_ref_ref_type'),)
+    # Restrict status to the CustomerStatus values, create a unique constraint
+    # on bill_ref and ref_type, and an index matching
+    # the active-customer lookup (ref_type last as it is optional); including id
+    # lets PostgreSQL answer the lookup from the index alone. The lookup always
+    # matches bill_ref, msisdn and status, so no separate (msisdn, status)
+    # index is needed
+    __table_args__ = (
+        CheckConstraint("status IN ('ACTIVE', 'INACTIVE', 'SUSPENDED')", name='ck_customer_status'),
+        UniqueConstraint('bill_ref', 'ref_type', name='uix_bill_ref_ref_type'),
+        Index('ix_customers_lookup', 'bill_ref', 'msisdn', 'status', 'ref_type', postgresql_include=['id']),
+    )
     
     # Relationships
     transactions = relationship("Transaction", back_populates="customer")
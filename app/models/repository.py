@@ -1,10 +1,15 @@
 """
 Database repository for Airtel Kenya C2B IPN system.
 """
-from typing import List, Optional, Dict, Any
-from datetime import datetime
-from sqlalchemy.orm import Session
+from typing import List, Optional, Dict, Any, Tuple
+import orjson
+from sqlalchemy import bindparam, case, insert, inspect, literal, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session, joinedload, make_transient_to_detached, selectinload
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlalchemy.sql import func
 
+from app.models.customer import Customer
 from app.models.transaction import Transaction, TransactionStatus
 from app.models.validation import ValidationResult
 from app.models.processing import ProcessingResult
@@ -12,6 +17,162 @@ from app.utils.logger import setup_logger
 
 logger = setup_logger("db_repository")
 
+# INSERT constructs supporting ON CONFLICT DO NOTHING ... RETURNING, by dialect
+_UPSERT_INSERTS = {
+    "postgresql": postgresql.insert,
+    "sqlite": sqlite.insert,
+}
+
+# Transaction status after a result, indexed by the result's success flag
+_VALIDATION_STATUS = (TransactionStatus.FAILED, TransactionStatus.VALIDATED)
+_PROCESSING_STATUS = (TransactionStatus.FAILED, TransactionStatus.PROCESSED)
+
+# Statements built once at import time; SQLAlchemy caches their compiled form
+_INSERT_TRANSACTION = insert(Transaction)
+_INSERT_TRANSACTION_RETURNING = _INSERT_TRANSACTION.returning(Transaction)
+_INSERT_RESULTS = {
+    ValidationResult: insert(ValidationResult),
+    ProcessingResult: insert(ProcessingResult),
+}
+_INSERT_RESULTS_RETURNING = {model: stmt.returning(model) for model, stmt in _INSERT_RESULTS.items()}
+_UPDATE_STATUS = (
+    update(Transaction.__table__)
+    .where(Transaction.__table__.c.id == bindparam("transaction_pk"))
+    .values(status=bindparam("new_status"), updated_at=func.now())
+)
+
+
+def _active_customer_criteria(bill_ref: str, ref_type: Optional[str], msisdn: str) -> list:
+    """
+    Build the WHERE criteria matching an active customer.
+    
+    Args:
+        bill_ref (str): Bill reference
+        ref_type (Optional[str]): Reference type
+        msisdn (str): Customer phone number
+        
+    Returns:
+        list: SQL criteria
+    """
+    criteria = [Customer.bill_ref == bill_ref, Customer.msisdn == msisdn, Customer.status == "ACTIVE"]
+    if ref_type:
+        criteria.append(Customer.ref_type == ref_type)
+    return criteria
+
+
+def _transaction_values(transaction_data: Dict[Any, Any]) -> Dict[str, Any]:
+    """
+    Build the column values of a new transaction, without customer_id.
+    
+    The status, timestamps and (unless given) payment date are left to
+    their server defaults. A raw payload given as a dict is serialized with
+    orjson, so the column always receives a JSON string.
+    
+    Args:
+        transaction_data (Dict[Any, Any]): Transaction data
+        
+    Returns:
+        Dict[str, Any]: Column values
+    """
+    raw_payload = transaction_data.get("raw_payload", "{}")
+    if isinstance(raw_payload, dict):
+        raw_payload = orjson.dumps(raw_payload).decode("utf-8")
+    
+    values = {
+        "transaction_id": transaction_data.get("transaction_id"),
+        "bill_ref": transaction_data.get("bill_ref"),
+        "ref_type": transaction_data.get("ref_type"),
+        "amount": float(transaction_data.get("amount", 0)),
+        "msisdn": transaction_data.get("msisdn"),
+        "merchant_msisdn": transaction_data.get("merchant_msisdn"),
+        "currency": transaction_data.get("currency", "KES"),
+        "airtel_reference": transaction_data.get("airtel_reference"),
+        "raw_payload": raw_payload,
+    }
+    if transaction_data.get("payment_date"):
+        values["payment_date"] = transaction_data["payment_date"]
+    return values
+
+
+def _insert_result_with_status(db: Session, model, values: Dict[str, Any], transaction: Transaction, status: TransactionStatus):
+    """
+    Insert a result row and set its transaction's status, without committing.
+    
+    On PostgreSQL both happen in one statement, WITH result AS (INSERT ...
+    RETURNING ...) UPDATE transactions ... FROM result; other dialects run
+    an INSERT and an UPDATE. Either way the status is written with a Core
+    UPDATE keyed by the transaction's identity, so an expired transaction is
+    not reloaded, and the session's copy is updated without being marked dirty.
+    
+    Args:
+        db (Session): Database session
+        model: Result model (ValidationResult or ProcessingResult)
+        values (Dict[str, Any]): Result column values, without transaction_id
+        transaction (Transaction): Transaction the result belongs to
+        status (TransactionStatus): New transaction status
+        
+    Returns:
+        Created result, attached to the session
+    """
+    transaction_pk = inspect(transaction).identity[0]
+    transactions = Transaction.__table__
+    
+    if db.get_bind().dialect.name == "postgresql":
+        result = (
+            insert(model)
+            .values(transaction_id=transaction_pk, **values)
+            .returning(*model.__table__.c)
+            .cte("result")
+        )
+        stmt = (
+            update(transactions)
+            .where(transactions.c.id == result.c.transaction_id)
+            .values(status=status, updated_at=func.now())
+            .returning(*result.c)
+        )
+        record = model(**db.execute(stmt).one()._mapping)
+        make_transient_to_detached(record)
+        db.add(record)
+    else:
+        params = dict(values, transaction_id=transaction_pk)
+        if db.get_bind().dialect.insert_returning:
+            record = db.scalars(_INSERT_RESULTS_RETURNING[model], [params]).one()
+        else:
+            record = model(**params)
+            db.add(record)
+            db.flush()
+        db.execute(_UPDATE_STATUS, {"transaction_pk": transaction_pk, "new_status": status})
+    
+    set_committed_value(transaction, "status", status)
+    # Set by the database clock; reloaded if read
+    db.expire(transaction, ["updated_at"])
+    return record
+
+
+class CustomerRepository:
+    """
+    Repository for Customer model operations.
+    """
+    
+    @staticmethod
+    def get_active_customer_id(db: Session, bill_ref: str, ref_type: Optional[str], msisdn: str) -> Optional[int]:
+        """
+        Get the ID of the active customer matching the IPN references.
+        
+        Only the ID column is selected, so no Customer instance is loaded.
+        
+        Args:
+            db (Session): Database session
+            bill_ref (str): Bill reference
+            ref_type (Optional[str]): Reference type
+            msisdn (str): Customer phone number
+            
+        Returns:
+            Optional[int]: Customer ID if found and active, None otherwise
+        """
+        stmt = select(Customer.id).where(*_active_customer_criteria(bill_ref, ref_type, msisdn)).limit(1)
+        return db.execute(stmt).scalar()
+
 
 class TransactionRepository:
     """
@@ -30,30 +191,122 @@ class TransactionRepository:
         Returns:
             Transaction: Created transaction
         """
-        transaction = Transaction(
-            transaction_id=transaction_data.get("transaction_id"),
-            bill_ref=transaction_data.get("bill_ref"),
-            ref_type=transaction_data.get("ref_type"),
-            amount=float(transaction_data.get("amount", 0)),
-            msisdn=transaction_data.get("msisdn"),
-            payment_date=transaction_data.get("payment_date", datetime.utcnow()),
-            currency=transaction_data.get("currency", "KES"),
-            status=TransactionStatus.PENDING,
-            raw_payload=transaction_data.get("raw_payload", "{}")
-        )
+        params = dict(_transaction_values(transaction_data), customer_id=transaction_data.get("customer_id"))
         
-        db.add(transaction)
+        # INSERT ... RETURNING loads the primary key and server defaults; no refresh is needed after commit
+        if db.get_bind().dialect.insert_returning:
+            transaction = db.scalars(_INSERT_TRANSACTION_RETURNING, [params]).one()
+        else:
+            transaction = Transaction(**params)
+            db.add(transaction)
+            db.flush()
+        transaction_pk = transaction.id
         db.commit()
-        db.refresh(transaction)
         
-        logger.info(f"Created transaction with ID: {transaction.id}")
+        logger.info("Created transaction with ID: %s", transaction_pk)
         
         return transaction
     
+    @staticmethod
+    def create_transactions_bulk(db: Session, transaction_data_list: List[Dict[Any, Any]], batch_size: int = 10_000) -> int:
+        """
+        Create many transactions with bulk INSERTs in a single commit.
+        
+        Rows are sent in batches of batch_size to cap memory; each batch is one
+        executemany, which the engine groups into multi-row INSERT statements.
+        
+        Args:
+            db (Session): Database session
+            transaction_data_list (List[Dict[Any, Any]]): Transaction data, including customer_id
+            batch_size (int): Number of rows per batch
+            
+        Returns:
+            int: Number of transactions created
+        """
+        for start in range(0, len(transaction_data_list), batch_size):
+            rows = [
+                dict(_transaction_values(data), customer_id=data.get("customer_id"))
+                for data in transaction_data_list[start:start + batch_size]
+            ]
+            db.execute(_INSERT_TRANSACTION, rows)
+        db.commit()
+        
+        logger.info("Created %d transactions in bulk", len(transaction_data_list))
+        
+        return len(transaction_data_list)
+    
+    @staticmethod
+    def validate_and_create(
+        db: Session,
+        transaction_data: Dict[Any, Any],
+        bill_ref: str,
+        ref_type: Optional[str],
+        msisdn: str
+    ) -> Tuple[Optional[int], Optional[Transaction]]:
+        """
+        Create a transaction for the active customer matching the IPN references.
+        
+        On PostgreSQL and SQLite the customer lookup, duplicate check and insert
+        run as one INSERT ... SELECT ... ON CONFLICT DO NOTHING RETURNING
+        statement, returning only the new row's ID and customer_id. The customer
+        is only looked up separately when no row is inserted, to tell a missing
+        customer from a duplicate transaction.
+        
+        Args:
+            db (Session): Database session
+            transaction_data (Dict[Any, Any]): Transaction data without customer_id
+            bill_ref (str): Bill reference
+            ref_type (Optional[str]): Reference type
+            msisdn (str): Customer phone number
+            
+        Returns:
+            Tuple[Optional[int], Optional[Transaction]]: Customer ID (None if no active
+            customer matches) and created transaction (None if it already exists)
+        """
+        upsert = _UPSERT_INSERTS.get(db.get_bind().dialect.name)
+        
+        if upsert is None:
+            customer_id = CustomerRepository.get_active_customer_id(db, bill_ref, ref_type, msisdn)
+            if customer_id is None:
+                return None, None
+            if TransactionRepository.get_transaction_by_transaction_id(db, transaction_data.get("transaction_id")):
+                return customer_id, None
+            transaction_data = dict(transaction_data, customer_id=customer_id)
+            return customer_id, TransactionRepository.create_transaction(db, transaction_data)
+        
+        values = _transaction_values(transaction_data)
+        columns = Transaction.__table__.c
+        source = (
+            select(Customer.id, *[literal(value, columns[name].type) for name, value in values.items()])
+            .where(*_active_customer_criteria(bill_ref, ref_type, msisdn))
+            .limit(1)
+        )
+        stmt = (
+            upsert(Transaction)
+            .from_select(["customer_id", *values], source)
+            .on_conflict_do_nothing(index_elements=["transaction_id"])
+            .returning(Transaction.id, Transaction.customer_id)
+        )
+        
+        row = db.execute(stmt).first()
+        if row is None:
+            return CustomerRepository.get_active_customer_id(db, bill_ref, ref_type, msisdn), None
+        
+        db.commit()
+        
+        # Only the key columns are returned; other attributes load on first access
+        transaction = Transaction(id=row.id, customer_id=row.customer_id)
+        make_transient_to_detached(transaction)
+        db.add(transaction)
+        
+        logger.info("Created transaction with ID: %s", row.id)
+        
+        return row.customer_id, transaction
+    
     @staticmethod
     def get_transaction_by_id(db: Session, transaction_id: int) -> Optional[Transaction]:
         """
-        Get transaction by ID.
+        Get transaction by ID, from the session's identity map if already loaded.
         
         Args:
             db (Session): Database session
@@ -62,12 +315,37 @@ class TransactionRepository:
         Returns:
             Optional[Transaction]: Transaction if found, None otherwise
         """
-        return db.query(Transaction).filter(Transaction.id == transaction_id).first()
+        return db.get(Transaction, transaction_id)
+    
+    @staticmethod
+    def get_with_results(db: Session, transaction_id: int) -> Optional[Transaction]:
+        """
+        Get transaction by ID with its validation and processing results loaded.
+        
+        Each collection is loaded with one SELECT ... IN query, so no query is
+        issued per result when they are accessed.
+        
+        Args:
+            db (Session): Database session
+            transaction_id (int): Transaction ID
+            
+        Returns:
+            Optional[Transaction]: Transaction if found, None otherwise
+        """
+        stmt = (
+            select(Transaction)
+            .options(
+                selectinload(Transaction.validation_results),
+                selectinload(Transaction.processing_results)
+            )
+            .where(Transaction.id == transaction_id)
+        )
+        return db.execute(stmt).scalar_one_or_none()
     
     @staticmethod
     def get_transaction_by_transaction_id(db: Session, transaction_id: str) -> Optional[Transaction]:
         """
-        Get transaction by transaction_id.
+        Get transaction by transaction_id, with its customer loaded in the same query.
         
         Args:
             db (Session): Database session
@@ -76,27 +354,45 @@ class TransactionRepository:
         Returns:
             Optional[Transaction]: Transaction if found, None otherwise
         """
-        return db.query(Transaction).filter(Transaction.transaction_id == transaction_id).first()
+        stmt = (
+            select(Transaction)
+            .options(joinedload(Transaction.customer))
+            .where(Transaction.transaction_id == transaction_id)
+        )
+        return db.scalars(stmt).first()
     
     @staticmethod
-    def get_transactions_by_bill_ref(db: Session, bill_ref: str) -> List[Transaction]:
+    def get_transactions_by_bill_ref(
+        db: Session,
+        bill_ref: str,
+        status: Optional[TransactionStatus] = None,
+        limit: Optional[int] = None
+    ) -> List[Transaction]:
         """
-        Get transactions by bill reference.
+        Get transactions by bill reference, newest first.
         
         Args:
             db (Session): Database session
             bill_ref (str): Bill reference
+            status (Optional[TransactionStatus]): Only return transactions with this status
+            limit (Optional[int]): Maximum number of transactions to return
             
         Returns:
             List[Transaction]: List of transactions
         """
-        return db.query(Transaction).filter(Transaction.bill_ref == bill_ref).all()
+        query = db.query(Transaction).filter(Transaction.bill_ref == bill_ref)
+        if status is not None:
+            query = query.filter(Transaction.status == status)
+        return query.order_by(Transaction.payment_date.desc()).limit(limit).all()
     
     @staticmethod
     def update_transaction_status(db: Session, transaction_id: int, status: TransactionStatus) -> Optional[Transaction]:
         """
         Update transaction status.
         
+        Uses a single UPDATE ... RETURNING where the dialect supports it, instead
+        of loading the transaction first.
+        
         Args:
             db (Session): Database session
             transaction_id (int): Transaction ID
@@ -105,20 +401,58 @@ class TransactionRepository:
         Returns:
             Optional[Transaction]: Updated transaction if found, None otherwise
         """
-        transaction = TransactionRepository.get_transaction_by_id(db, transaction_id)
-        
-        if transaction:
+        if not db.get_bind().dialect.update_returning:
+            transaction = TransactionRepository.get_transaction_by_id(db, transaction_id)
+            if transaction is None:
+                return None
             transaction.status = status
-            transaction.updated_at = datetime.utcnow()
-            
+            transaction.updated_at = func.now()
             db.commit()
-            db.refresh(transaction)
-            
-            logger.info(f"Updated transaction {transaction_id} status to {status.value}")
-            
-            return transaction
+        else:
+            stmt = (
+                update(Transaction)
+                .where(Transaction.id == transaction_id)
+                .values(status=status, updated_at=func.now())
+                .returning(Transaction)
+                .execution_options(synchronize_session=False, populate_existing=True)
+            )
+            transaction = db.scalars(stmt).one_or_none()
+            if transaction is None:
+                return None
+            db.commit()
+        
+        logger.info("Updated transaction %s status to %s", transaction_id, status.value)
         
-        return None
+        return transaction
+    
+    @staticmethod
+    def set_statuses(db: Session, statuses: Dict[int, TransactionStatus]):
+        """
+        Set the status of many transactions with one UPDATE ... CASE statement.
+        
+        The change is not committed, so the caller can commit it together with
+        the writes that caused it.
+        
+        Args:
+            db (Session): Database session
+            statuses (Dict[int, TransactionStatus]): New status by transaction ID
+        """
+        if not statuses:
+            return
+        status_type = Transaction.__table__.c.status.type
+        stmt = (
+            update(Transaction)
+            .where(Transaction.id.in_(statuses))
+            .values(
+                status=case(
+                    {pk: literal(status, status_type) for pk, status in statuses.items()},
+                    value=Transaction.id,
+                ),
+                updated_at=func.now(),
+            )
+            .execution_options(synchronize_session=False)
+        )
+        db.execute(stmt)
 
 
 class ValidationResultRepository:
@@ -127,40 +461,66 @@ class ValidationResultRepository:
     """
     
     @staticmethod
-    def create_validation_result(db: Session, transaction_id: int, is_valid: bool, message: Optional[str] = None) -> ValidationResult:
+    def create_validation_result(db: Session, transaction: Transaction, is_valid: bool, message: Optional[str] = None) -> ValidationResult:
         """
-        Create a new validation result.
+        Create a new validation result and update the transaction status.
+        
+        The result and the status change are written in a single commit, and
+        on PostgreSQL in a single statement.
         
         Args:
             db (Session): Database session
-            transaction_id (int): Transaction ID
+            transaction (Transaction): Validated transaction
             is_valid (bool): Whether the transaction is valid
             message (Optional[str]): Validation message
             
         Returns:
             ValidationResult: Created validation result
         """
-        validation_result = ValidationResult(
-            transaction_id=transaction_id,
-            is_valid=is_valid,
-            validation_message=message,
-            validation_date=datetime.utcnow()
-        )
+        values = {
+            "is_valid": is_valid,
+            "validation_message": message,
+        }
+        status = _VALIDATION_STATUS[bool(is_valid)]
         
-        db.add(validation_result)
+        validation_result = _insert_result_with_status(db, ValidationResult, values, transaction, status)
+        transaction_pk = validation_result.transaction_id
         db.commit()
-        db.refresh(validation_result)
-        
-        # Update transaction status
-        transaction = TransactionRepository.get_transaction_by_id(db, transaction_id)
-        if transaction:
-            new_status = TransactionStatus.VALIDATED if is_valid else TransactionStatus.FAILED
-            TransactionRepository.update_transaction_status(db, transaction_id, new_status)
         
-        logger.info(f"Created validation result for transaction {transaction_id}: {'valid' if is_valid else 'invalid'}")
+        logger.info("Created validation result for transaction %s: %s", transaction_pk, "valid" if is_valid else "invalid")
         
         return validation_result
     
+    @staticmethod
+    def create_many(db: Session, rows: List[Dict[str, Any]], batch_size: int = 10_000) -> int:
+        """
+        Create many validation results and update their transactions' status.
+        
+        Each batch of rows is one bulk INSERT plus one status UPDATE, and
+        everything is written in a single commit.
+        
+        Args:
+            db (Session): Database session
+            rows (List[Dict[str, Any]]): Validation results with transaction_id,
+                is_valid and optionally validation_message and validation_date
+            batch_size (int): Number of rows per batch
+            
+        Returns:
+            int: Number of validation results created
+        """
+        for start in range(0, len(rows), batch_size):
+            batch = rows[start:start + batch_size]
+            db.execute(_INSERT_RESULTS[ValidationResult], batch)
+            TransactionRepository.set_statuses(db, {
+                row["transaction_id"]: _VALIDATION_STATUS[bool(row["is_valid"])]
+                for row in batch
+            })
+        db.commit()
+        
+        logger.info("Created %d validation results in bulk", len(rows))
+        
+        return len(rows)
+    
     @staticmethod
     def get_validation_results_by_transaction_id(db: Session, transaction_id: int) -> List[ValidationResult]:
         """
@@ -182,40 +542,65 @@ class ProcessingResultRepository:
     """
     
     @staticmethod
-    def create_processing_result(db: Session, transaction_id: int, is_processed: bool, message: Optional[str] = None) -> ProcessingResult:
+    def create_processing_result(db: Session, transaction: Transaction, is_processed: bool, message: Optional[str] = None) -> ProcessingResult:
         """
         Create a new processing result.
         
+        The result and the transaction status change are written, in a single
+        statement on PostgreSQL, but not committed, so the caller can commit
+        the whole processing step at once.
+        
         Args:
             db (Session): Database session
-            transaction_id (int): Transaction ID
+            transaction (Transaction): Processed transaction
             is_processed (bool): Whether the transaction was processed successfully
             message (Optional[str]): Processing message
             
         Returns:
             ProcessingResult: Created processing result
         """
-        processing_result = ProcessingResult(
-            transaction_id=transaction_id,
-            is_processed=is_processed,
-            processing_message=message,
-            processing_date=datetime.utcnow()
-        )
-        
-        db.add(processing_result)
-        db.commit()
-        db.refresh(processing_result)
+        values = {
+            "is_processed": is_processed,
+            "processing_message": message,
+        }
+        status = _PROCESSING_STATUS[bool(is_processed)]
         
-        # Update transaction status
-        transaction = TransactionRepository.get_transaction_by_id(db, transaction_id)
-        if transaction:
-            new_status = TransactionStatus.PROCESSED if is_processed else TransactionStatus.FAILED
-            TransactionRepository.update_transaction_status(db, transaction_id, new_status)
+        processing_result = _insert_result_with_status(db, ProcessingResult, values, transaction, status)
         
-        logger.info(f"Created processing result for transaction {transaction_id}: {'processed' if is_processed else 'failed'}")
+        logger.info("Created processing result for transaction %s: %s", processing_result.transaction_id, "processed" if is_processed else "failed")
         
         return processing_result
     
+    @staticmethod
+    def create_many(db: Session, rows: List[Dict[str, Any]], batch_size: int = 10_000) -> int:
+        """
+        Create many processing results and update their transactions' status.
+        
+        Each batch of rows is one bulk INSERT plus one status UPDATE, and
+        everything is written in a single commit.
+        
+        Args:
+            db (Session): Database session
+            rows (List[Dict[str, Any]]): Processing results with transaction_id,
+                is_processed and optionally processing_message and processing_date
+            batch_size (int): Number of rows per batch
+            
+        Returns:
+            int: Number of processing results created
+        """
+        for start in range(0, len(rows), batch_size):
+            batch = rows[start:start + batch_size]
+            db.execute(_INSERT_RESULTS[ProcessingResult], batch)
+            TransactionRepository.set_statuses(db, {
+                row["transaction_id"]: _PROCESSING_STATUS[bool(row["is_processed"])]
+                for row in batch
+            })
+        db.commit()
+        
+        logger.info("Created %d processing results in bulk", len(rows))
+        
+        return len(rows)
+    
     @staticmethod
     def get_processing_results_by_transaction_id(db: Session, transaction_id: int) -> List[ProcessingResult]:
         """
@@ -1,12 +1,13 @@
 """
 Fixed Transaction model with proper relationship to Customer.
 """
-from sqlalchemy import Column, Integer, String, Float, Enum, DateTime, ForeignKey
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, String, Numeric, Enum, DateTime, ForeignKey, Index, text
+from sqlalchemy.orm import deferred, relationship
+from sqlalchemy.sql import func
 import enum
-import datetime
 
 from app.database import Base
+from app.models.types import BigId, CompressedText
 
 
 class TransactionStatus(enum.Enum):
@@ -22,23 +23,31 @@ class Transaction(Base):
     """
     __tablename__ = 'transactions'
 
-    id = Column(Integer, primary_key=True)
+    id = Column(BigId, primary_key=True)
     transaction_id = Column(String(100), unique=True, nullable=False, index=True)
     customer_id = Column(Integer, ForeignKey('customers.id'), nullable=False)
-    bill_ref = Column(String(100), nullable=False, index=True)
+    bill_ref = Column(String(100), nullable=False)
     ref_type = Column(String(50), nullable=False)
-    amount = Column(Float, nullable=False)
+    # Stored exactly to the cent; read back as float, as the API returns it
+    amount = Column(Numeric(12, 2, asdecimal=False), nullable=False)
     msisdn = Column(String(20), nullable=False)  # Customer phone number
     merchant_msisdn = Column(String(20), nullable=True)  # Merchant phone number
-    payment_date = Column(DateTime, nullable=False, default=datetime.datetime.utcnow)
+    payment_date = Column(DateTime, nullable=False, server_default=func.now())
     currency = Column(String(10), nullable=False, default="KES")
-    status = Column(Enum(TransactionStatus), nullable=False, default=TransactionStatus.PENDING)
+    status = Column(Enum(TransactionStatus), nullable=False, server_default=text("'PENDING'"))
     airtel_reference = Column(String(100), nullable=True)  # Reference from Airtel
     mobiquity_reference = Column(String(100), nullable=True)  # Reference from Mobiquity
-    raw_payload = Column(String, nullable=False)  # Raw request payload
-    created_at = Column(DateTime, nullable=False, default=datetime.datetime.utcnow)
-    updated_at = Column(DateTime, nullable=False, default=datetime.datetime.utcnow,
-                        onupdate=datetime.datetime.utcnow)
+    # Raw request payload, zlib-compressed; only loaded when accessed
+    raw_payload = deferred(Column(CompressedText, nullable=False))
+    created_at = Column(DateTime, nullable=False, server_default=func.now())
+    updated_at = Column(DateTime, nullable=False, server_default=func.now(), onupdate=func.now())
+    
+    # Serve bill reference lookups, optionally by status, newest first; the
+    # included columns let PostgreSQL answer listings from the index alone
+    __table_args__ = (
+        Index('ix_tx_billref_status_date', 'bill_ref', 'status', payment_date.desc(),
+              postgresql_include=['amount', 'msisdn']),
+    )
     
     # Define relationship with Customer
     customer = relationship("Customer", back_populates="transactions")
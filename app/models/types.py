@@ -0,0 +1,28 @@
+"""
+Custom column types for Airtel Kenya C2B IPN system.
+"""
+import zlib
+
+from sqlalchemy.types import BigInteger, Integer, LargeBinary, TypeDecorator
+
+# 64-bit key for high-volume tables; SQLite keeps INTEGER, which it requires
+# for autoincrementing (rowid) primary keys
+BigId = BigInteger().with_variant(Integer, "sqlite")
+
+
+class CompressedText(TypeDecorator):
+    """
+    Text stored zlib-compressed in a binary column.
+    """
+    impl = LargeBinary
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        return zlib.compress(value.encode("utf-8"))
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        return zlib.decompress(value).decode("utf-8")
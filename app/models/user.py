@@ -2,7 +2,7 @@
 User model for JWT authentication in Airtel Kenya C2B IPN system.
 """
 from sqlalchemy import Column, Integer, String, Boolean, DateTime
-import datetime
+from sqlalchemy.sql import func
 
 from app.database import Base
 
@@ -18,6 +18,5 @@ class User(Base):
     password_hash = Column(String(255), nullable=False)
     email = Column(String(255), unique=True, nullable=False)
     is_active = Column(Boolean, nullable=False, default=True)
-    created_at = Column(DateTime, nullable=False, default=datetime.datetime.utcnow)
-    updated_at = Column(DateTime, nullable=False, default=datetime.datetime.utcnow,
-                        onupdate=datetime.datetime.utcnow)
+    created_at = Column(DateTime, nullable=False, server_default=func.now())
+    updated_at = Column(DateTime, nullable=False, server_default=func.now(), onupdate=func.now())
@@ -1,11 +1,12 @@
 """
 Validation model for Airtel Kenya C2B IPN system.
 """
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey
+from sqlalchemy import Column, String, Boolean, DateTime, ForeignKey
 from sqlalchemy.orm import relationship
-import datetime
+from sqlalchemy.sql import func
 
 from app.database import Base
+from app.models.types import BigId
 
 
 class ValidationResult(Base):
@@ -14,11 +15,11 @@ class ValidationResult(Base):
     """
     __tablename__ = 'validation_results'
 
-    id = Column(Integer, primary_key=True)
-    transaction_id = Column(Integer, ForeignKey('transactions.id'), nullable=False)
+    id = Column(BigId, primary_key=True)
+    transaction_id = Column(BigId, ForeignKey('transactions.id'), nullable=False, index=True)
     is_valid = Column(Boolean, nullable=False)
     validation_message = Column(String(255), nullable=True)
-    validation_date = Column(DateTime, nullable=False, default=datetime.datetime.utcnow)
+    validation_date = Column(DateTime, nullable=False, server_default=func.now())
     
     # Relationships
     transaction = relationship("Transaction", back_populates="validation_results")
@@ -1,5 +1,29 @@
 """
 Package initialization for app tests.
 """
+from functools import lru_cache
 
-__all__ = []
+from fastapi.testclient import TestClient
+
+from app.main import app
+
+# Endpoint paths, as mounted by app.main
+VALIDATE_URL = "/airtel/c2b/api/validate"
+PROCESS_URL = "/airtel/c2b/api/process/"
+
+
+@lru_cache(maxsize=None)
+def get_client() -> TestClient:
+    """
+    Get the TestClient for the application, shared by all test classes.
+    
+    The get_db override is installed on the app itself and tests pass their
+    own Authorization header, so the client carries no per-test state.
+    
+    Returns:
+        TestClient: Test client
+    """
+    return TestClient(app)
+
+
+__all__ = ['PROCESS_URL', 'VALIDATE_URL', 'get_client']
@@ -2,63 +2,85 @@
 Updated tests for enhanced Airtel Kenya C2B IPN system.
 """
 import unittest
-import json
+import orjson
 import xml.etree.ElementTree as ET
-from fastapi.testclient import TestClient
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
-from sqlalchemy.pool import StaticPool
+from sqlalchemy import create_engine, event, func, insert, select
+from sqlalchemy.orm import Session
 from datetime import datetime, timedelta
 
-from app.database import Base, get_db
+from app.database import Base, engine_options, get_db
 from app.main import app
+from app.tests import PROCESS_URL, VALIDATE_URL, get_client
 from app.models.customer import Customer, CustomerStatus
+from app.models.transaction import Transaction
 from app.models.user import User
 from app.utils.security import get_password_hash, create_access_token
 
 
 # Create in-memory SQLite database for testing
 SQLALCHEMY_DATABASE_URL = "sqlite:///:memory:"
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL,
-    connect_args={"check_same_thread": False},
-    poolclass=StaticPool,
-)
-TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+engine = create_engine(SQLALCHEMY_DATABASE_URL, **engine_options(SQLALCHEMY_DATABASE_URL))
+
 
+# Let SQLAlchemy emit BEGIN itself so that SAVEPOINTs work with pysqlite,
+# and keep SQLite's temporary sort/index files in memory as well
+@event.listens_for(engine, "connect")
+def do_connect(dbapi_connection, connection_record):
+    dbapi_connection.isolation_level = None
+    dbapi_connection.execute("PRAGMA temp_store=MEMORY")
 
-# Override the get_db dependency
-def override_get_db():
-    try:
-        db = TestingSessionLocal()
-        yield db
-    finally:
-        db.close()
 
+@event.listens_for(engine, "begin")
+def do_begin(conn):
+    conn.exec_driver_sql("BEGIN")
 
-# Override the get_current_active_user dependency
-async def override_get_current_active_user():
-    return {"username": "test_user", "email": "test@example.com", "is_active": True}
 
+# bcrypt is slow by design, so the test user's password is hashed once
+_TEST_PASSWORD_HASH = get_password_hash("test_password")
 
-app.dependency_overrides[get_db] = override_get_db
-app.dependency_overrides["app.utils.security.get_current_active_user"] = override_get_current_active_user
+# Access token for the test user, valid for the whole test run
+_ACCESS_TOKEN = create_access_token(
+    data={"sub": "test_user"},
+    expires_delta=timedelta(hours=1)
+)
+_HEADERS = {"Authorization": f"Bearer {_ACCESS_TOKEN}"}
 
 
 class TestEnhancedEndpoints(unittest.TestCase):
     """Test cases for enhanced API endpoints."""
 
-    def setUp(self):
-        """Set up test database and client."""
-        # Create tables
+    @classmethod
+    def setUpClass(cls):
+        """Create the schema and client once for all tests."""
         Base.metadata.create_all(bind=engine)
-        self.client = TestClient(app)
-        self.db = TestingSessionLocal()
+        cls.client = get_client()
+
+    @classmethod
+    def tearDownClass(cls):
+        """Drop the schema."""
+        Base.metadata.drop_all(bind=engine)
+
+    def setUp(self):
+        """Set up test data inside a transaction that is rolled back afterwards."""
+        self.connection = engine.connect()
+        self.transaction = self.connection.begin()
+        # Commits in the fixtures and the application release a SAVEPOINT instead
+        self.db = Session(bind=self.connection, autoflush=False, join_transaction_mode="create_savepoint")
+        
+        def override_get_db():
+            yield self.db
+        
+        self.previous_get_db = app.dependency_overrides.get(get_db)
+        app.dependency_overrides[get_db] = override_get_db
+        
+        # Every test validates the same transaction IDs, so anything left
+        # over from a previous test means the rollback did not happen
+        self.assertEqual(self.db.scalar(select(func.count()).select_from(Transaction)), 0)
         
         # Create test user
         test_user = User(
             username="test_user",
-            password_hash=get_password_hash("test_password"),
+            password_hash=_TEST_PASSWORD_HASH,
             email="test@example.com",
             is_active=True
         )
@@ -66,7 +88,7 @@ class TestEnhancedEndpoints(unittest.TestCase):
         
         # Create test customers
         test_customers = [
-            Customer(
+            dict(
                 bill_ref="ACC123456",
                 ref_type="ACCOUNT",
                 msisdn="254712345678",
@@ -74,9 +96,9 @@ class TestEnhancedEndpoints(unittest.TestCase):
                 email="john.doe@example.com",
                 id_number="12345678",
                 address="123 Main St, Nairobi",
-                status=CustomerStatus.ACTIVE
+                status=CustomerStatus.ACTIVE.value
             ),
-            Customer(
+            dict(
                 bill_ref="INV789012",
                 ref_type="INVOICE",
                 msisdn="254723456789",
@@ -84,9 +106,9 @@ class TestEnhancedEndpoints(unittest.TestCase):
                 email="jane.smith@example.com",
                 id_number="87654321",
                 address="456 Park Ave, Nairobi",
-                status=CustomerStatus.ACTIVE
+                status=CustomerStatus.ACTIVE.value
             ),
-            Customer(
+            dict(
                 bill_ref="MTR456789",
                 ref_type="METER",
                 msisdn="254734567890",
@@ -94,21 +116,17 @@ class TestEnhancedEndpoints(unittest.TestCase):
                 email="bob.johnson@example.com",
                 id_number="23456789",
                 address="789 Oak St, Nairobi",
-                status=CustomerStatus.INACTIVE  # Inactive customer for testing
+                status=CustomerStatus.INACTIVE.value  # Inactive customer for testing
             )
         ]
         
-        for customer in test_customers:
-            self.db.add(customer)
+        # One multi-row INSERT instead of an ORM flush per customer
+        self.db.execute(insert(Customer), test_customers)
         
         self.db.commit()
         
-        # Get access token
-        access_token = create_access_token(
-            data={"sub": "test_user"},
-            expires_delta=timedelta(minutes=30)
-        )
-        self.headers = {"Authorization": f"Bearer {access_token}"}
+        # Access token, signed once for the module
+        self.headers = _HEADERS
         
         # Sample valid XML payload
         self.valid_xml_payload = """
@@ -169,9 +187,22 @@ class TestEnhancedEndpoints(unittest.TestCase):
         }
     
     def tearDown(self):
-        """Clean up test database."""
+        """Roll back everything the test wrote."""
+        if self.previous_get_db is None:
+            del app.dependency_overrides[get_db]
+        else:
+            app.dependency_overrides[get_db] = self.previous_get_db
         self.db.close()
-        Base.metadata.drop_all(bind=engine)
+        self.transaction.rollback()
+        self.connection.close()
+    
+    def _post_json(self, path, payload, headers=None):
+        """Post a payload encoded with orjson, as the endpoints decode it."""
+        return self.client.post(
+            path,
+            headers={**(headers or {}), "Content-Type": "application/json"},
+            content=orjson.dumps(payload)
+        )
     
     def test_auth_endpoint(self):
         """Test authentication endpoint."""
@@ -180,14 +211,14 @@ class TestEnhancedEndpoints(unittest.TestCase):
             data={"username": "test_user", "password": "test_password"}
         )
         self.assertEqual(response.status_code, 200)
-        data = response.json()
+        data = orjson.loads(response.content)
         self.assertIn("access_token", data)
         self.assertEqual(data["token_type"], "bearer")
     
     def test_validate_endpoint_xml_valid_customer(self):
         """Test validation endpoint with valid XML payload and valid customer."""
         response = self.client.post(
-            "/api/validate/",
+            VALIDATE_URL,
             headers=self.headers,
             content=self.valid_xml_payload
         )
@@ -197,48 +228,32 @@ class TestEnhancedEndpoints(unittest.TestCase):
     
     def test_validate_endpoint_json_valid_customer(self):
         """Test validation endpoint with valid JSON payload and valid customer."""
-        response = self.client.post(
-            "/api/validate/",
-            headers=self.headers,
-            json=self.valid_json_payload
-        )
+        response = self._post_json(VALIDATE_URL, self.valid_json_payload, self.headers)
         self.assertEqual(response.status_code, 200)
-        data = response.json()
+        data = orjson.loads(response.content)
         self.assertEqual(data["status"], "SUCCESS")
         self.assertEqual(data["transactionId"], self.valid_json_payload["REFERENCE1"])
     
     def test_validate_endpoint_nonexistent_customer(self):
         """Test validation endpoint with non-existent customer."""
-        response = self.client.post(
-            "/api/validate/",
-            headers=self.headers,
-            json=self.invalid_customer_payload
-        )
+        response = self._post_json(VALIDATE_URL, self.invalid_customer_payload, self.headers)
         self.assertEqual(response.status_code, 200)  # API returns 200 even for validation errors
-        data = response.json()
+        data = orjson.loads(response.content)
         self.assertEqual(data["status"], "FAILED")
         self.assertIn("Customer not found", data["message"])
     
     def test_validate_endpoint_inactive_customer(self):
         """Test validation endpoint with inactive customer."""
-        response = self.client.post(
-            "/api/validate/",
-            headers=self.headers,
-            json=self.inactive_customer_payload
-        )
+        response = self._post_json(VALIDATE_URL, self.inactive_customer_payload, self.headers)
         self.assertEqual(response.status_code, 200)
-        data = response.json()
+        data = orjson.loads(response.content)
         self.assertEqual(data["status"], "FAILED")
         self.assertIn("Customer not found or inactive", data["message"])
     
     def test_process_endpoint_after_validation(self):
         """Test processing endpoint after successful validation."""
         # First validate the transaction
-        self.client.post(
-            "/api/validate/",
-            headers=self.headers,
-            json=self.valid_json_payload
-        )
+        self._post_json(VALIDATE_URL, self.valid_json_payload, self.headers)
         
         # Then process it
         process_payload = {
@@ -247,13 +262,9 @@ class TestEnhancedEndpoints(unittest.TestCase):
             "REFERENCE2": "MOB123456789"
         }
         
-        response = self.client.post(
-            "/api/process/",
-            headers=self.headers,
-            json=process_payload
-        )
+        response = self._post_json(PROCESS_URL, process_payload, self.headers)
         self.assertEqual(response.status_code, 200)
-        data = response.json()
+        data = orjson.loads(response.content)
         self.assertEqual(data["status"], "SUCCESS")
         self.assertEqual(data["transactionId"], self.valid_json_payload["REFERENCE1"])
         self.assertEqual(data["billRef"], self.valid_json_payload["REFERENCE"])
@@ -267,13 +278,9 @@ class TestEnhancedEndpoints(unittest.TestCase):
             "REFERENCE2": "MOB123456789"
         }
         
-        response = self.client.post(
-            "/api/process/",
-            headers=self.headers,
-            json=process_payload
-        )
+        response = self._post_json(PROCESS_URL, process_payload, self.headers)
         self.assertEqual(response.status_code, 200)
-        data = response.json()
+        data = orjson.loads(response.content)
         self.assertEqual(data["status"], "FAILED")
         self.assertIn("Transaction not found", data["message"])
     
@@ -281,7 +288,7 @@ class TestEnhancedEndpoints(unittest.TestCase):
         """Test processing endpoint with XML format."""
         # First validate the transaction
         self.client.post(
-            "/api/validate/",
+            VALIDATE_URL,
             headers=self.headers,
             content=self.valid_xml_payload
         )
@@ -296,7 +303,7 @@ class TestEnhancedEndpoints(unittest.TestCase):
         """
         
         response = self.client.post(
-            "/api/process/",
+            PROCESS_URL,
             headers=self.headers,
             content=process_xml
         )
@@ -306,26 +313,13 @@ class TestEnhancedEndpoints(unittest.TestCase):
     
     def test_unauthorized_access(self):
         """Test unauthorized access to protected endpoints."""
-        # Remove the dependency override to test actual authentication
-        app.dependency_overrides.pop("app.utils.security.get_current_active_user", None)
+        # Try to access validate endpoint without token
+        response = self._post_json(VALIDATE_URL, self.valid_json_payload)
+        self.assertEqual(response.status_code, 401)
         
-        try:
-            # Try to access validate endpoint without token
-            response = self.client.post(
-                "/api/validate/",
-                json=self.valid_json_payload
-            )
-            self.assertEqual(response.status_code, 401)
-            
-            # Try to access process endpoint without token
-            response = self.client.post(
-                "/api/process/",
-                json={"REFERENCE1": self.valid_json_payload["REFERENCE1"]}
-            )
-            self.assertEqual(response.status_code, 401)
-        finally:
-            # Restore the dependency override
-            app.dependency_overrides["app.utils.security.get_current_active_user"] = override_get_current_active_user
+        # Try to access process endpoint without token
+        response = self._post_json(PROCESS_URL, {"REFERENCE1": self.valid_json_payload["REFERENCE1"]})
+        self.assertEqual(response.status_code, 401)
 
 
 if __name__ == "__main__":
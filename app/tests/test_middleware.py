@@ -0,0 +1,180 @@
+"""
+Tests for the JWT authentication middleware of the Airtel Kenya C2B IPN system.
+"""
+import unittest
+from datetime import timedelta
+from unittest import mock
+from jose import jwt
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import Session
+
+from app.database import Base, engine_options, get_db
+from app.main import app
+from app.models.user import User
+from app.tests import get_client
+from app.utils import middleware, security
+from app.utils.security import create_access_token, get_cached_user
+
+
+# Create in-memory SQLite database for testing
+SQLALCHEMY_DATABASE_URL = "sqlite:///:memory:"
+engine = create_engine(SQLALCHEMY_DATABASE_URL, **engine_options(SQLALCHEMY_DATABASE_URL))
+
+
+# Let SQLAlchemy emit BEGIN itself so that SAVEPOINTs work with pysqlite,
+# and keep SQLite's temporary sort/index files in memory as well
+@event.listens_for(engine, "connect")
+def do_connect(dbapi_connection, connection_record):
+    dbapi_connection.isolation_level = None
+    dbapi_connection.execute("PRAGMA temp_store=MEMORY")
+
+
+@event.listens_for(engine, "begin")
+def do_begin(conn):
+    conn.exec_driver_sql("BEGIN")
+
+
+# Any request that passes the middleware reaches this endpoint
+USER_URL = "/auth/users/me"
+
+
+def bearer(token):
+    """Build the Authorization header for a token."""
+    return {"Authorization": f"Bearer {token}"}
+
+
+class TestJWTAuthMiddleware(unittest.TestCase):
+    """Test cases for JWTAuthMiddleware."""
+
+    @classmethod
+    def setUpClass(cls):
+        """Create the schema and client once for all tests."""
+        Base.metadata.create_all(bind=engine)
+        cls.client = get_client()
+
+    @classmethod
+    def tearDownClass(cls):
+        """Drop the schema."""
+        Base.metadata.drop_all(bind=engine)
+
+    def setUp(self):
+        """Set up an active and an inactive user with an empty user cache."""
+        self.connection = engine.connect()
+        self.transaction = self.connection.begin()
+        self.db = Session(bind=self.connection, autoflush=False, join_transaction_mode="create_savepoint")
+
+        def override_get_db():
+            yield self.db
+
+        self.previous_get_db = app.dependency_overrides.get(get_db)
+        app.dependency_overrides[get_db] = override_get_db
+
+        # Tokens are cached by value, and other test modules sign tokens too
+        cache = mock.patch.dict(security._USER_CACHE, clear=True)
+        cache.start()
+        self.addCleanup(cache.stop)
+
+        self.db.add_all([
+            User(username="active_user", password_hash="unused", email="active@example.com", is_active=True),
+            User(username="inactive_user", password_hash="unused", email="inactive@example.com", is_active=False),
+        ])
+        self.db.commit()
+
+        self.token = create_access_token(data={"sub": "active_user"}, expires_delta=timedelta(minutes=5))
+
+    def tearDown(self):
+        """Roll back everything the test wrote."""
+        if self.previous_get_db is None:
+            del app.dependency_overrides[get_db]
+        else:
+            app.dependency_overrides[get_db] = self.previous_get_db
+        self.db.close()
+        self.transaction.rollback()
+        self.connection.close()
+
+    def assert_rejected(self, response, status_code, detail):
+        """Check a response sent by the middleware itself."""
+        self.assertEqual(response.status_code, status_code)
+        self.assertEqual(response.json(), {"detail": detail})
+        if status_code == 401:
+            self.assertEqual(response.headers["www-authenticate"], "Bearer")
+
+    def test_valid_token(self):
+        """Test that the authenticated user reaches the endpoint."""
+        response = self.client.get(USER_URL, headers=bearer(self.token))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {
+            "username": "active_user",
+            "email": "active@example.com",
+            "is_active": True
+        })
+
+    def test_cache_miss_then_hit(self):
+        """Test that the user is loaded once and then served from the cache."""
+        with mock.patch.object(middleware, "_get_user", wraps=middleware._get_user) as get_user:
+            self.assertIsNone(get_cached_user(self.token))
+
+            response = self.client.get(USER_URL, headers=bearer(self.token))
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(get_user.call_count, 1)
+            self.assertEqual(get_cached_user(self.token)["username"], "active_user")
+
+            # Deleting the user does not matter while its token is cached
+            self.db.query(User).filter(User.username == "active_user").delete()
+            self.db.commit()
+            response = self.client.get(USER_URL, headers=bearer(self.token))
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.json()["username"], "active_user")
+            self.assertEqual(get_user.call_count, 1)
+
+    def test_missing_token(self):
+        """Test that a request without a bearer token is rejected."""
+        self.assert_rejected(self.client.get(USER_URL), 401, "Not authenticated")
+
+    def test_malformed_authorization_header(self):
+        """Test that headers without a bearer token are rejected."""
+        for value in (self.token, f"Basic {self.token}", "Bearer", "Bearer "):
+            with self.subTest(value=value):
+                response = self.client.get(USER_URL, headers={"Authorization": value})
+                self.assert_rejected(response, 401, "Not authenticated")
+
+    def test_invalid_token(self):
+        """Test that tokens which do not decode are rejected and not cached."""
+        forged = jwt.encode({"sub": "active_user"}, "not-the-secret-key", algorithm=security.ALGORITHM)
+        for token in ("not-a-jwt", forged):
+            with self.subTest(token=token):
+                response = self.client.get(USER_URL, headers=bearer(token))
+                self.assert_rejected(response, 401, "Could not validate credentials")
+                self.assertIsNone(get_cached_user(token))
+
+    def test_expired_token(self):
+        """Test that an expired token is rejected."""
+        token = create_access_token(data={"sub": "active_user"}, expires_delta=timedelta(minutes=-1))
+        response = self.client.get(USER_URL, headers=bearer(token))
+        self.assert_rejected(response, 401, "Could not validate credentials")
+
+    def test_unknown_user(self):
+        """Test that a token for a user that does not exist is rejected."""
+        token = create_access_token(data={"sub": "unknown_user"}, expires_delta=timedelta(minutes=5))
+        response = self.client.get(USER_URL, headers=bearer(token))
+        self.assert_rejected(response, 401, "Could not validate credentials")
+        self.assertIsNone(get_cached_user(token))
+
+    def test_inactive_user(self):
+        """Test that an inactive user is rejected, from the database and from the cache."""
+        token = create_access_token(data={"sub": "inactive_user"}, expires_delta=timedelta(minutes=5))
+        for attempt in ("miss", "hit"):
+            with self.subTest(cache=attempt):
+                response = self.client.get(USER_URL, headers=bearer(token))
+                self.assert_rejected(response, 400, "Inactive user")
+                self.assertFalse(get_cached_user(token)["is_active"])
+
+    def test_excluded_path(self):
+        """Test that excluded paths need no token."""
+        response = self.client.get("/health")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {"status": "healthy"})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,304 @@
+"""
+Tests for the database repositories of the Airtel Kenya C2B IPN system.
+"""
+import unittest
+import zlib
+from unittest import mock
+import orjson
+from sqlalchemy import create_engine, event, func, inspect, select, text
+from sqlalchemy.orm import Session
+
+from app.database import Base, engine_options
+from app.models import repository
+from app.models.customer import Customer, CustomerStatus
+from app.models.processing import ProcessingResult
+from app.models.repository import ProcessingResultRepository, TransactionRepository, ValidationResultRepository
+from app.models.transaction import Transaction, TransactionStatus
+from app.models.validation import ValidationResult
+
+
+# Create in-memory SQLite database for testing
+SQLALCHEMY_DATABASE_URL = "sqlite:///:memory:"
+engine = create_engine(SQLALCHEMY_DATABASE_URL, **engine_options(SQLALCHEMY_DATABASE_URL))
+
+
+# Let SQLAlchemy emit BEGIN itself so that SAVEPOINTs work with pysqlite,
+# and keep SQLite's temporary sort/index files in memory as well
+@event.listens_for(engine, "connect")
+def do_connect(dbapi_connection, connection_record):
+    dbapi_connection.isolation_level = None
+    dbapi_connection.execute("PRAGMA temp_store=MEMORY")
+
+
+@event.listens_for(engine, "begin")
+def do_begin(conn):
+    conn.exec_driver_sql("BEGIN")
+
+
+class RepositoryTestCase(unittest.TestCase):
+    """Base class running each test in a transaction that is rolled back afterwards."""
+
+    @classmethod
+    def setUpClass(cls):
+        """Create the schema once for all tests."""
+        Base.metadata.create_all(bind=engine)
+
+    @classmethod
+    def tearDownClass(cls):
+        """Drop the schema."""
+        Base.metadata.drop_all(bind=engine)
+
+    def setUp(self):
+        """Set up an active and an inactive customer."""
+        self.connection = engine.connect()
+        self.transaction = self.connection.begin()
+        # Commits in the repositories release a SAVEPOINT instead
+        self.db = Session(bind=self.connection, autoflush=False, join_transaction_mode="create_savepoint")
+
+        self.customer = Customer(
+            bill_ref="ACC123456",
+            ref_type="ACCOUNT",
+            msisdn="254712345678",
+            full_name="John Doe",
+            status=CustomerStatus.ACTIVE.value
+        )
+        self.inactive_customer = Customer(
+            bill_ref="MTR456789",
+            ref_type="METER",
+            msisdn="254734567890",
+            full_name="Bob Johnson",
+            status=CustomerStatus.INACTIVE.value
+        )
+        self.db.add_all([self.customer, self.inactive_customer])
+        self.db.commit()
+        self.customer_id = self.customer.id
+
+    def tearDown(self):
+        """Roll back everything the test wrote."""
+        self.db.close()
+        self.transaction.rollback()
+        self.connection.close()
+
+    def transaction_data(self, transaction_id="TRX123456789", **overrides):
+        """Build transaction data for the active customer."""
+        data = {
+            "transaction_id": transaction_id,
+            "bill_ref": "ACC123456",
+            "ref_type": "ACCOUNT",
+            "amount": 1000.00,
+            "msisdn": "254712345678",
+            "merchant_msisdn": "254700000000",
+            "airtel_reference": transaction_id,
+            "raw_payload": '{"REFERENCE1": "%s"}' % transaction_id
+        }
+        data.update(overrides)
+        return data
+
+    def count_transactions(self):
+        """Count the stored transactions."""
+        return self.db.scalar(select(func.count()).select_from(Transaction))
+
+    def create_transactions(self, count):
+        """Create pending transactions for the active customer and return their IDs."""
+        TransactionRepository.create_transactions_bulk(self.db, [
+            self.transaction_data("TRX%d" % i, customer_id=self.customer_id) for i in range(count)
+        ])
+        return list(self.db.scalars(select(Transaction.id).order_by(Transaction.transaction_id)))
+
+    def statuses(self):
+        """Get the stored status of every transaction, by ID."""
+        return dict(self.db.execute(select(Transaction.id, Transaction.status)).all())
+
+
+class TestValidateAndCreate(RepositoryTestCase):
+    """Test cases for TransactionRepository.validate_and_create."""
+
+    def validate_and_create(self, transaction_id="TRX123456789", bill_ref="ACC123456",
+                            ref_type="ACCOUNT", msisdn="254712345678"):
+        # The endpoint stores ACCOUNT when the reference type is unknown
+        data = self.transaction_data(transaction_id, bill_ref=bill_ref, ref_type=ref_type or "ACCOUNT", msisdn=msisdn)
+        return TransactionRepository.validate_and_create(self.db, data, bill_ref, ref_type, msisdn)
+
+    def assert_outcomes(self):
+        """Check the inserted, duplicate and no-customer outcomes in turn."""
+        # Inserted for the matching active customer
+        customer_id, transaction = self.validate_and_create()
+        self.assertEqual(customer_id, self.customer_id)
+        self.assertIsNotNone(transaction)
+        self.assertIn(transaction, self.db)
+        self.assertEqual(transaction.customer_id, self.customer_id)
+
+        stored = self.db.get(Transaction, inspect(transaction).identity[0])
+        self.assertEqual(stored.transaction_id, "TRX123456789")
+        self.assertEqual(stored.status, TransactionStatus.PENDING)
+        self.assertEqual(stored.amount, 1000.00)
+        self.assertEqual(stored.raw_payload, '{"REFERENCE1": "TRX123456789"}')
+
+        # Duplicate transaction for the same customer
+        customer_id, transaction = self.validate_and_create()
+        self.assertEqual(customer_id, self.customer_id)
+        self.assertIsNone(transaction)
+
+        # No active customer: unknown references, or an inactive customer
+        for bill_ref, ref_type, msisdn in (
+            ("UNKNOWN123", "ACCOUNT", "254799999999"),
+            ("ACC123456", "INVOICE", "254712345678"),
+            ("MTR456789", "METER", "254734567890"),
+        ):
+            with self.subTest(bill_ref=bill_ref, ref_type=ref_type):
+                customer_id, transaction = self.validate_and_create("TRX_" + bill_ref, bill_ref, ref_type, msisdn)
+                self.assertIsNone(customer_id)
+                self.assertIsNone(transaction)
+
+        self.assertEqual(self.count_transactions(), 1)
+
+    def test_upsert(self):
+        """Test the single INSERT ... ON CONFLICT DO NOTHING statement."""
+        self.assertIn(self.db.get_bind().dialect.name, repository._UPSERT_INSERTS)
+        self.assert_outcomes()
+
+    def test_fallback_without_upsert(self):
+        """Test the separate lookups used on dialects without ON CONFLICT."""
+        with mock.patch.dict(repository._UPSERT_INSERTS, clear=True):
+            self.assert_outcomes()
+
+    def test_without_ref_type(self):
+        """Test that a missing reference type matches on bill_ref and msisdn only."""
+        customer_id, transaction = self.validate_and_create(ref_type=None)
+        self.assertEqual(customer_id, self.customer_id)
+        self.assertIsNotNone(transaction)
+
+
+
+class TestCreateTransactionsBulk(RepositoryTestCase):
+    """Test cases for TransactionRepository.create_transactions_bulk."""
+
+    def test_create_transactions_bulk(self):
+        """Test that every row is inserted, across batches, for its customer."""
+        rows = [
+            self.transaction_data("TRX%d" % i, customer_id=self.customer_id, amount=100 + i)
+            for i in range(5)
+        ]
+        # A dict payload is serialized to JSON before it is compressed
+        rows[0]["raw_payload"] = {"REFERENCE1": "TRX0", "AMOUNT": "100"}
+
+        created = TransactionRepository.create_transactions_bulk(self.db, rows, batch_size=2)
+        self.assertEqual(created, 5)
+
+        transactions = self.db.scalars(
+            select(Transaction).order_by(Transaction.transaction_id)
+        ).all()
+        self.assertEqual([t.transaction_id for t in transactions], ["TRX%d" % i for i in range(5)])
+        for i, transaction in enumerate(transactions):
+            with self.subTest(transaction_id=transaction.transaction_id):
+                self.assertEqual(transaction.customer_id, self.customer_id)
+                self.assertEqual(transaction.amount, 100 + i)
+                self.assertEqual(transaction.status, TransactionStatus.PENDING)
+
+        self.assertEqual(orjson.loads(transactions[0].raw_payload), {"REFERENCE1": "TRX0", "AMOUNT": "100"})
+        self.assertEqual(transactions[1].raw_payload, '{"REFERENCE1": "TRX1"}')
+
+        # The column itself holds the zlib-compressed payload
+        stored = self.db.execute(
+            text("SELECT raw_payload FROM transactions WHERE transaction_id = 'TRX1'")
+        ).scalar_one()
+        self.assertEqual(zlib.decompress(stored).decode("utf-8"), '{"REFERENCE1": "TRX1"}')
+
+    def test_create_transactions_bulk_empty(self):
+        """Test that an empty list inserts nothing."""
+        self.assertEqual(TransactionRepository.create_transactions_bulk(self.db, []), 0)
+        self.assertEqual(self.count_transactions(), 0)
+
+
+
+class TestBulkStatusUpdates(RepositoryTestCase):
+    """Test cases for set_statuses and the bulk result repositories."""
+
+    def test_set_statuses(self):
+        """Test that one UPDATE sets a different status per transaction."""
+        first, second, third = self.create_transactions(3)
+
+        TransactionRepository.set_statuses(self.db, {
+            first: TransactionStatus.VALIDATED,
+            second: TransactionStatus.FAILED,
+        })
+        self.db.commit()
+
+        self.assertEqual(self.statuses(), {
+            first: TransactionStatus.VALIDATED,
+            second: TransactionStatus.FAILED,
+            third: TransactionStatus.PENDING,
+        })
+
+    def test_set_statuses_empty(self):
+        """Test that no statement is issued without statuses."""
+        with mock.patch.object(self.db, "execute") as execute:
+            TransactionRepository.set_statuses(self.db, {})
+        execute.assert_not_called()
+
+    def test_validation_results_create_many(self):
+        """Test a mixed batch of valid and invalid validation results."""
+        first, second, third = self.create_transactions(3)
+        rows = [
+            {"transaction_id": first, "is_valid": True, "validation_message": "Transaction validated successfully"},
+            {"transaction_id": second, "is_valid": False, "validation_message": "Customer not found or inactive"},
+            {"transaction_id": third, "is_valid": True},
+        ]
+
+        self.assertEqual(ValidationResultRepository.create_many(self.db, rows, batch_size=2), 3)
+
+        results = self.db.execute(
+            select(ValidationResult.transaction_id, ValidationResult.is_valid, ValidationResult.validation_message)
+            .order_by(ValidationResult.transaction_id)
+        ).all()
+        self.assertEqual([tuple(result) for result in results], [
+            (first, True, "Transaction validated successfully"),
+            (second, False, "Customer not found or inactive"),
+            (third, True, None),
+        ])
+        self.assertEqual(self.statuses(), {
+            first: TransactionStatus.VALIDATED,
+            second: TransactionStatus.FAILED,
+            third: TransactionStatus.VALIDATED,
+        })
+
+    def test_processing_results_create_many(self):
+        """Test a mixed batch of processed and failed processing results."""
+        first, second, third = self.create_transactions(3)
+        rows = [
+            {"transaction_id": first, "is_processed": False, "processing_message": "Payment failed"},
+            {"transaction_id": second, "is_processed": True, "processing_message": "Transaction processed successfully"},
+            {"transaction_id": third, "is_processed": True},
+        ]
+
+        self.assertEqual(ProcessingResultRepository.create_many(self.db, rows, batch_size=2), 3)
+
+        results = self.db.execute(
+            select(ProcessingResult.transaction_id, ProcessingResult.is_processed, ProcessingResult.processing_message)
+            .order_by(ProcessingResult.transaction_id)
+        ).all()
+        self.assertEqual([tuple(result) for result in results], [
+            (first, False, "Payment failed"),
+            (second, True, "Transaction processed successfully"),
+            (third, True, None),
+        ])
+        self.assertEqual(self.statuses(), {
+            first: TransactionStatus.FAILED,
+            second: TransactionStatus.PROCESSED,
+            third: TransactionStatus.PROCESSED,
+        })
+
+    def test_create_many_empty(self):
+        """Test that empty input creates no results and changes no status."""
+        ids = self.create_transactions(1)
+
+        self.assertEqual(ValidationResultRepository.create_many(self.db, []), 0)
+        self.assertEqual(ProcessingResultRepository.create_many(self.db, []), 0)
+
+        self.assertIsNone(self.db.scalar(select(ValidationResult.id)))
+        self.assertIsNone(self.db.scalar(select(ProcessingResult.id)))
+        self.assertEqual(self.statuses(), {ids[0]: TransactionStatus.PENDING})
+
+
+if __name__ == "__main__":
+    unittest.main()
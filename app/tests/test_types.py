@@ -0,0 +1,68 @@
+"""
+Unit tests for custom column types in the Airtel Kenya C2B IPN system.
+"""
+import unittest
+import zlib
+from sqlalchemy import Column, Integer, MetaData, Table, create_engine, insert, select, text
+
+from app.models.types import CompressedText
+
+
+class TestCompressedText(unittest.TestCase):
+    """Test cases for the CompressedText column type."""
+
+    def setUp(self):
+        """Create a table with a compressed column in an in-memory database."""
+        self.engine = create_engine("sqlite://")
+        self.table = Table(
+            "payloads",
+            MetaData(),
+            Column("id", Integer, primary_key=True),
+            Column("payload", CompressedText, nullable=True),
+        )
+        self.table.metadata.create_all(self.engine)
+
+    def tearDown(self):
+        """Dispose of the database."""
+        self.engine.dispose()
+
+    def test_round_trip(self):
+        """Test that values read back equal the values written."""
+        test_cases = [
+            "",
+            '{"REFERENCE1": "TRX123456789", "AMOUNT": "1000.00"}',
+            "<COMMAND><CUSTOMERNAME>Wanjikũ Njoroge</CUSTOMERNAME></COMMAND>",
+            "x" * 100_000,
+        ]
+
+        with self.engine.begin() as conn:
+            conn.execute(insert(self.table), [{"payload": value} for value in test_cases])
+            stored = conn.execute(select(self.table.c.payload).order_by(self.table.c.id)).scalars().all()
+
+        self.assertEqual(stored, test_cases)
+
+    def test_stored_compressed(self):
+        """Test that the column holds zlib-compressed UTF-8."""
+        value = '{"REFERENCE1": "TRX123456789"}' * 100
+
+        with self.engine.begin() as conn:
+            conn.execute(insert(self.table), {"payload": value})
+            raw = conn.execute(text("SELECT payload FROM payloads")).scalar_one()
+
+        self.assertIsInstance(raw, bytes)
+        self.assertLess(len(raw), len(value))
+        self.assertEqual(zlib.decompress(raw).decode("utf-8"), value)
+
+    def test_none(self):
+        """Test that NULL is stored and read back as None."""
+        with self.engine.begin() as conn:
+            conn.execute(insert(self.table), {"payload": None})
+            raw = conn.execute(text("SELECT payload FROM payloads")).scalar_one()
+            stored = conn.execute(select(self.table.c.payload)).scalar_one()
+
+        self.assertIsNone(raw)
+        self.assertIsNone(stored)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,17 +1,67 @@
 """
 Logger utility for Airtel Kenya C2B IPN system.
 """
+import atexit
 import logging
 import os
-from logging.handlers import RotatingFileHandler
+import queue
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 
 from app.config import LOG_LEVEL, LOG_FILE
 
+# Formatter shared by all handlers
+_FORMATTER = logging.Formatter(
+    '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+
+# Records are put on this queue by the loggers and written out by a
+# background listener thread, created on first use
+_log_queue = queue.SimpleQueue()
+_queue_handler = None
+
+
+def _get_queue_handler():
+    """
+    Get the queue handler shared by all loggers, starting the listener on the first call.
+    
+    Logging calls only enqueue the record; the listener thread writes it to
+    the console and the rotating log file, so request threads never block on
+    a write or a rotation. The listener is stopped, flushing the queue, at exit.
+    
+    Returns:
+        QueueHandler: Logging handler
+    """
+    global _queue_handler
+    if _queue_handler is None:
+        log_level = getattr(logging, LOG_LEVEL.upper(), logging.INFO)
+        
+        # Console handler
+        console_handler = logging.StreamHandler()
+        
+        # File handler
+        file_handler = RotatingFileHandler(
+            LOG_FILE, maxBytes=10*1024*1024, backupCount=5
+        )
+        
+        for handler in (console_handler, file_handler):
+            handler.setLevel(log_level)
+            handler.setFormatter(_FORMATTER)
+        
+        listener = QueueListener(_log_queue, console_handler, file_handler, respect_handler_level=True)
+        listener.start()
+        atexit.register(listener.stop)
+        
+        _queue_handler = QueueHandler(_log_queue)
+    return _queue_handler
+
 
 def setup_logger(name="airtel_ipn"):
     """
     Set up and configure logger.
     
+    Calling it again for the same name returns the configured logger
+    without adding handlers a second time.
+    
     Args:
         name (str): Logger name
         
@@ -20,33 +70,15 @@ def setup_logger(name="airtel_ipn"):
     """
     # Create logger
     logger = logging.getLogger(name)
+    if logger.handlers:
+        return logger
     
     # Set log level
     log_level = getattr(logging, LOG_LEVEL.upper(), logging.INFO)
     logger.setLevel(log_level)
     
-    # Create handlers
-    # Console handler
-    console_handler = logging.StreamHandler()
-    console_handler.setLevel(log_level)
-    
-    # File handler
-    file_handler = RotatingFileHandler(
-        LOG_FILE, maxBytes=10*1024*1024, backupCount=5
-    )
-    file_handler.setLevel(log_level)
-    
-    # Create formatter
-    formatter = logging.Formatter(
-        '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-    )
-    
-    # Add formatter to handlers
-    console_handler.setFormatter(formatter)
-    file_handler.setFormatter(formatter)
-    
-    # Add handlers to logger
-    logger.addHandler(console_handler)
-    logger.addHandler(file_handler)
+    # Add the queue handler; records are not passed on to the root logger's handlers too
+    logger.addHandler(_get_queue_handler())
+    logger.propagate = False
     
     return logger
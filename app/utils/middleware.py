@@ -0,0 +1,166 @@
+"""
+ASGI middleware for Airtel Kenya C2B IPN system.
+"""
+import inspect
+import json
+from typing import Any, Dict, Iterable, Optional
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.orm import Session
+
+from app.database import get_db
+from app.models.user import User
+from app.utils.security import cache_user, decode_access_token_claims, get_cached_user
+
+
+def _get_user(db: Session, username: str) -> Optional[User]:
+    """
+    Query a user by username; run on the threadpool as it blocks on the database.
+    
+    Args:
+        db (Session): Database session
+        username (str): Username
+        
+    Returns:
+        Optional[User]: User if found, None otherwise
+    """
+    return db.query(User).filter(User.username == username).first()
+
+
+class JWTAuthMiddleware:
+    """
+    Pure ASGI middleware that authenticates requests with a JWT bearer token.
+
+    The Authorization header is read straight from the ASGI scope and the
+    authenticated user is attached to ``scope["user"]``, so endpoints read it
+    from ``request.scope["user"]`` instead of resolving a per-route dependency.
+    """
+
+    def __init__(self, app, excluded_paths: Iterable[str] = ()):
+        self.app = app
+        self.excluded = set(excluded_paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in self.excluded:
+            await self.app(scope, receive, send)
+            return
+
+        token = None
+        for name, value in scope["headers"]:
+            if name == b"authorization":
+                scheme, _, credentials = value.decode("latin-1").partition(" ")
+                if scheme.lower() == "bearer" and credentials:
+                    token = credentials
+                break
+
+        if token is None:
+            await self._reject(send, 401, "Not authenticated")
+            return
+
+        # Tokens seen recently skip the JWT decode and the user query
+        user = get_cached_user(token)
+        if user is None:
+            claims = decode_access_token_claims(token)
+            username = claims.get("sub") if claims else None
+            user = await self._load_user(scope, username) if username else None
+            if user is None:
+                await self._reject(send, 401, "Could not validate credentials")
+                return
+            cache_user(token, user, claims.get("exp"))
+        if not user["is_active"]:
+            await self._reject(send, 400, "Inactive user")
+            return
+
+        scope["user"] = user
+        await self.app(scope, receive, send)
+
+    @staticmethod
+    async def _load_user(scope, username: str) -> Optional[Dict[str, Any]]:
+        """
+        Load the user for a token, honouring ``get_db`` dependency overrides.
+
+        Args:
+            scope: ASGI connection scope
+            username (str): Username from the token
+
+        Returns:
+            Optional[Dict[str, Any]]: User information if found, None otherwise
+        """
+        get_session = scope["app"].dependency_overrides.get(get_db, get_db)
+        sessions = get_session()
+        is_async = inspect.isasyncgen(sessions)
+        db = await sessions.__anext__() if is_async else next(sessions)
+        try:
+            user = await run_in_threadpool(_get_user, db, username)
+            if user is None:
+                return None
+            return {
+                "id": user.id,
+                "username": user.username,
+                "email": user.email,
+                "is_active": user.is_active
+            }
+        finally:
+            if is_async:
+                await sessions.aclose()
+            else:
+                sessions.close()
+
+    @staticmethod
+    async def _reject(send, status_code: int, detail: str):
+        """
+        Send an error response without entering the application.
+
+        Args:
+            send: ASGI send callable
+            status_code (int): HTTP status code
+            detail (str): Error detail
+        """
+        body = json.dumps({"detail": detail}).encode("utf-8")
+        headers = [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode("latin-1")),
+        ]
+        if status_code == 401:
+            headers.append((b"www-authenticate", b"Bearer"))
+        await send({"type": "http.response.start", "status": status_code, "headers": headers})
+        await send({"type": "http.response.body", "body": body})
+
+
+class ProfilingMiddleware:
+    """
+    Pure ASGI middleware that profiles requests sent with ``?profile=1``.
+
+    The request is run under a pyinstrument sampling profiler and the
+    application's response is replaced with the profiler's HTML report.
+    Requests without the query flag pass straight through.
+    """
+
+    def __init__(self, app):
+        from pyinstrument import Profiler
+
+        self.app = app
+        self.profiler_class = Profiler
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["query_string"].find(b"profile=1") < 0:
+            await self.app(scope, receive, send)
+            return
+
+        async def discard(message):
+            pass
+
+        profiler = self.profiler_class(async_mode="enabled")
+        profiler.start()
+        try:
+            await self.app(scope, receive, discard)
+        finally:
+            profiler.stop()
+
+        body = profiler.output_html().encode("utf-8")
+        headers = [
+            (b"content-type", b"text/html; charset=utf-8"),
+            (b"content-length", str(len(body)).encode("latin-1")),
+        ]
+        await send({"type": "http.response.start", "status": 200, "headers": headers})
+        await send({"type": "http.response.body", "body": body})
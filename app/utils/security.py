@@ -1,8 +1,10 @@
 """
 Security utilities for JWT authentication in Airtel Kenya C2B IPN system.
 """
+import hashlib
+import time
 from datetime import datetime, timedelta
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Tuple
 
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
@@ -18,6 +20,13 @@ SECRET_KEY = "YOUR_SECRET_KEY_HERE"  # In production, use environment variable
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
+# Authenticated users by token digest, as (expiry, user info). Entries live
+# for at most _USER_CACHE_TTL seconds and never past the token's expiry, so
+# deactivating a user takes up to _USER_CACHE_TTL seconds to take effect.
+_USER_CACHE: Dict[bytes, Tuple[float, Dict[str, Any]]] = {}
+_USER_CACHE_TTL = 60.0
+_USER_CACHE_MAX = 10_000
+
 # Password hashing
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
@@ -88,6 +97,85 @@ def create_access_token(data: Dict[str, Any], expires_delta: Optional[timedelta]
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
+def decode_access_token_claims(token: str) -> Optional[Dict[str, Any]]:
+    """
+    Decode and verify a JWT access token.
+    
+    Args:
+        token (str): JWT token
+        
+    Returns:
+        Optional[Dict[str, Any]]: Token claims if the token is valid, None otherwise
+    """
+    try:
+        return jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        return None
+
+def decode_access_token(token: str) -> Optional[str]:
+    """
+    Decode a JWT access token.
+    
+    Args:
+        token (str): JWT token
+        
+    Returns:
+        Optional[str]: Username from the token if it is valid, None otherwise
+    """
+    claims = decode_access_token_claims(token)
+    return claims.get("sub") if claims else None
+
+def _token_key(token: str) -> bytes:
+    """
+    Digest a token for use as a user cache key.
+    
+    Args:
+        token (str): JWT token
+        
+    Returns:
+        bytes: 16-byte BLAKE2b digest of the token
+    """
+    return hashlib.blake2b(token.encode(), digest_size=16).digest()
+
+def get_cached_user(token: str) -> Optional[Dict[str, Any]]:
+    """
+    Get the user cached for a token.
+    
+    Args:
+        token (str): JWT token
+        
+    Returns:
+        Optional[Dict[str, Any]]: User information if cached and not expired, None otherwise
+    """
+    entry = _USER_CACHE.get(_token_key(token))
+    if entry is None or entry[0] <= time.monotonic():
+        return None
+    return entry[1]
+
+def cache_user(token: str, user: Dict[str, Any], token_expiry: Optional[float] = None):
+    """
+    Cache the user authenticated by a token.
+    
+    Args:
+        token (str): JWT token
+        user (Dict[str, Any]): User information
+        token_expiry (Optional[float]): Token "exp" claim as a Unix timestamp
+    """
+    now = time.monotonic()
+    expires_at = now + _USER_CACHE_TTL
+    if token_expiry is not None:
+        expires_at = min(expires_at, now + token_expiry - time.time())
+    
+    # Evict lazily: drop expired entries once the cache is full, and start
+    # over if that is not enough
+    if len(_USER_CACHE) >= _USER_CACHE_MAX:
+        for key in [key for key, entry in _USER_CACHE.items() if entry[0] <= now]:
+            del _USER_CACHE[key]
+        if len(_USER_CACHE) >= _USER_CACHE_MAX:
+            _USER_CACHE.clear()
+    
+    _USER_CACHE[_token_key(token)] = (expires_at, user)
+
 async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)) -> User:
     """
     Get the current user from a JWT token.
@@ -107,12 +195,8 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = De
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None:
-            raise credentials_exception
-    except JWTError:
+    username = decode_access_token(token)
+    if username is None:
         raise credentials_exception
     user = db.query(User).filter(User.username == username).first()
     if user is None:
@@ -1,9 +1,35 @@
 """
 Validators utility for Airtel Kenya C2B IPN system.
 """
-import re
+import string
+from functools import lru_cache
 from typing import Tuple, Optional
 
+# Characters allowed in a bill reference number
+_BILL_REF_CHARS = frozenset(string.ascii_letters + string.digits + "_-.")
+
+# Allowed reference types, in the order they are listed in error messages
+_REF_TYPES = ("MSISDN", "ACCOUNT", "INVOICE", "POLICY", "METER", "OTHER")
+_ALLOWED_REF_TYPES = frozenset(_REF_TYPES)
+_REF_TYPE_ERROR = f"Reference type must be one of: {', '.join(_REF_TYPES)}"
+
+
+@lru_cache(maxsize=4096)
+def _has_valid_bill_ref_chars(bill_ref: str) -> bool:
+    """
+    Check that a bill reference contains only allowed characters.
+    
+    Results are cached, as the same references recur across IPNs; only
+    references within the length limit reach the cache.
+    
+    Args:
+        bill_ref (str): Bill reference number to check
+        
+    Returns:
+        bool: True if every character is allowed
+    """
+    return _BILL_REF_CHARS.issuperset(bill_ref)
+
 
 def validate_bill_ref(bill_ref: str) -> Tuple[bool, Optional[str]]:
     """
@@ -24,16 +50,19 @@ def validate_bill_ref(bill_ref: str) -> Tuple[bool, Optional[str]]:
         return False, "Bill reference number is too long"
     
     # Check if bill_ref contains only alphanumeric characters and some special characters
-    if not re.match(r'^[a-zA-Z0-9_\-\.]+$', bill_ref):
+    if not _has_valid_bill_ref_chars(bill_ref):
         return False, "Bill reference number contains invalid characters"
     
     return True, None
 
 
+@lru_cache(maxsize=64)
 def validate_ref_type(ref_type: str) -> Tuple[bool, Optional[str]]:
     """
     Validate the reference type.
     
+    Results are cached; reference types come from a small fixed set.
+    
     Args:
         ref_type (str): Reference type to validate
         
@@ -44,11 +73,8 @@ def validate_ref_type(ref_type: str) -> Tuple[bool, Optional[str]]:
     if not ref_type:
         return False, "Reference type cannot be empty"
     
-    # Define allowed reference types
-    allowed_ref_types = ["MSISDN", "ACCOUNT", "INVOICE", "POLICY", "METER", "OTHER"]
-    
-    # Check if ref_type is in allowed list (case insensitive)
-    if ref_type.upper() not in allowed_ref_types:
-        return False, f"Reference type must be one of: {', '.join(allowed_ref_types)}"
+    # Check if ref_type is an allowed type (case insensitive)
+    if ref_type.upper() not in _ALLOWED_REF_TYPES:
+        return False, _REF_TYPE_ERROR
     
     return True, None
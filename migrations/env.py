@@ -27,6 +27,10 @@ from app.models.user import User
 from app.database import Base
 target_metadata = Base.metadata
 
+# Use the application's database settings; escape % for ConfigParser
+from app.config import DB_URL
+config.set_main_option("sqlalchemy.url", DB_URL.replace("%", "%%"))
+
 # other values from the config, defined by the needs of env.py,
 # can be acquired:
 # my_important_option = config.get_main_option("my_important_option")
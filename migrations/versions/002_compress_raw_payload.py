@@ -0,0 +1,75 @@
+"""
+Store transactions.raw_payload zlib-compressed in a binary column.
+"""
+from alembic import context, op
+from alembic.util import CommandError
+import sqlalchemy as sa
+import zlib
+
+# Revision identifiers
+revision = '002_compress_raw_payload'
+down_revision = '001_initial_schema'
+branch_labels = None
+depends_on = None
+
+# Rows converted per UPDATE batch
+BATCH_SIZE = 1000
+
+
+def _require_online():
+    """
+    Refuse to generate an offline (--sql) script for this revision.
+    
+    The payloads are compressed in Python, which a SQL script cannot do.
+    """
+    if context.is_offline_mode():
+        raise CommandError(
+            "Revision %s compresses existing raw_payload values in Python and "
+            "cannot be run in offline (--sql) mode; run it against the database, "
+            "then generate SQL for the later revisions with "
+            "'alembic upgrade %s:head --sql'." % (revision, revision)
+        )
+
+
+def _convert(source, target, convert):
+    """
+    Copy every transaction's raw_payload from one column to another.
+    
+    Args:
+        source (str): Column to read
+        target (str): Column to write
+        convert: Function converting a source value to a target value
+    """
+    conn = op.get_bind()
+    transactions = sa.table(
+        'transactions',
+        sa.column('id', sa.Integer),
+        sa.column(source),
+        sa.column(target),
+    )
+    stmt = (
+        sa.update(transactions)
+        .where(transactions.c.id == sa.bindparam('row_id'))
+        .values({target: sa.bindparam('value')})
+    )
+    rows = conn.execution_options(stream_results=True).execute(
+        sa.select(transactions.c.id, transactions.c[source])
+    )
+    for batch in rows.partitions(BATCH_SIZE):
+        conn.execute(stmt, [{'row_id': row[0], 'value': convert(row[1])} for row in batch])
+
+
+def upgrade():
+    _require_online()
+    op.add_column('transactions', sa.Column('raw_payload_z', sa.LargeBinary(), nullable=True))
+    _convert('raw_payload', 'raw_payload_z', lambda value: zlib.compress(value.encode('utf-8')))
+    op.drop_column('transactions', 'raw_payload')
+    op.alter_column('transactions', 'raw_payload_z', new_column_name='raw_payload', nullable=False)
+
+
+def downgrade():
+    _require_online()
+    op.add_column('transactions', sa.Column('raw_payload_text', sa.Text(), nullable=True))
+    _convert('raw_payload', 'raw_payload_text', lambda value: zlib.decompress(value).decode('utf-8'))
+    op.drop_column('transactions', 'raw_payload')
+    op.alter_column('transactions', 'raw_payload_text', new_column_name='raw_payload', nullable=False)
@@ -0,0 +1,26 @@
+"""
+Replace the transactions bill_ref index with a (bill_ref, status, payment_date) index.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# Revision identifiers
+revision = '003_transaction_bill_ref_index'
+down_revision = '002_compress_raw_payload'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index(
+        'ix_tx_billref_status_date',
+        'transactions',
+        ['bill_ref', 'status', sa.text('payment_date DESC')],
+        postgresql_include=['amount', 'msisdn'],
+    )
+    op.drop_index('ix_transactions_bill_ref', table_name='transactions')
+
+
+def downgrade():
+    op.create_index('ix_transactions_bill_ref', 'transactions', ['bill_ref'])
+    op.drop_index('ix_tx_billref_status_date', table_name='transactions')
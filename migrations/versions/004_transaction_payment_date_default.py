@@ -0,0 +1,19 @@
+"""
+Default transactions.payment_date to the insert time on the server.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# Revision identifiers
+revision = '004_transaction_payment_date_default'
+down_revision = '003_transaction_bill_ref_index'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.alter_column('transactions', 'payment_date', server_default=sa.text('NOW()'))
+
+
+def downgrade():
+    op.alter_column('transactions', 'payment_date', server_default=None)
@@ -0,0 +1,23 @@
+"""
+Store transactions.raw_payload out of line without TOAST compression.
+
+The column already holds zlib-compressed bytes, so PostgreSQL's own attempt
+to compress large values only spends CPU on every such insert.
+"""
+from alembic import op
+
+# Revision identifiers
+revision = '005_raw_payload_storage_external'
+down_revision = '004_transaction_payment_date_default'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute("ALTER TABLE transactions ALTER COLUMN raw_payload SET STORAGE EXTERNAL")
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute("ALTER TABLE transactions ALTER COLUMN raw_payload SET STORAGE EXTENDED")
@@ -0,0 +1,30 @@
+"""
+Store transactions.amount as exact NUMERIC(12, 2) instead of double precision.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# Revision identifiers
+revision = '006_transaction_amount_numeric'
+down_revision = '005_raw_payload_storage_external'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.alter_column(
+        'transactions', 'amount',
+        type_=sa.Numeric(12, 2),
+        existing_type=sa.Float(),
+        existing_nullable=False,
+        postgresql_using='round(amount::numeric, 2)',
+    )
+
+
+def downgrade():
+    op.alter_column(
+        'transactions', 'amount',
+        type_=sa.Float(),
+        existing_type=sa.Numeric(12, 2),
+        existing_nullable=False,
+    )
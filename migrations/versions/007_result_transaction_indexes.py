@@ -0,0 +1,20 @@
+"""
+Index validation_results and processing_results by transaction.
+"""
+from alembic import op
+
+# Revision identifiers
+revision = '007_result_transaction_indexes'
+down_revision = '006_transaction_amount_numeric'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_validation_results_transaction_id', 'validation_results', ['transaction_id'])
+    op.create_index('ix_processing_results_transaction_id', 'processing_results', ['transaction_id'])
+
+
+def downgrade():
+    op.drop_index('ix_processing_results_transaction_id', table_name='processing_results')
+    op.drop_index('ix_validation_results_transaction_id', table_name='validation_results')
@@ -0,0 +1,40 @@
+"""
+Widen transaction and result ids, and the keys referencing them, to BIGINT.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# Revision identifiers
+revision = '008_bigint_transaction_ids'
+down_revision = '007_result_transaction_indexes'
+branch_labels = None
+depends_on = None
+
+# (table, column) pairs widened, referenced ids before the keys pointing at them
+COLUMNS = [
+    ('transactions', 'id'),
+    ('validation_results', 'id'),
+    ('validation_results', 'transaction_id'),
+    ('processing_results', 'id'),
+    ('processing_results', 'transaction_id'),
+]
+
+# PostgreSQL sequences behind the SERIAL ids; these are created as integer and
+# would still stop at 2^31 - 1 after the columns are widened
+SEQUENCES = ['transactions_id_seq', 'validation_results_id_seq', 'processing_results_id_seq']
+
+
+def upgrade():
+    for table, column in COLUMNS:
+        op.alter_column(table, column, type_=sa.BigInteger(), existing_type=sa.Integer(), existing_nullable=False)
+    if op.get_bind().dialect.name == 'postgresql':
+        for sequence in SEQUENCES:
+            op.execute(f"ALTER SEQUENCE {sequence} AS bigint")
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        for sequence in SEQUENCES:
+            op.execute(f"ALTER SEQUENCE {sequence} AS integer")
+    for table, column in reversed(COLUMNS):
+        op.alter_column(table, column, type_=sa.Integer(), existing_type=sa.BigInteger(), existing_nullable=False)
@@ -0,0 +1,38 @@
+"""
+Store customers.status as VARCHAR(16) restricted by a CHECK constraint.
+
+Replaces the native customerstatus enum type, so statuses can be added
+without ALTER TYPE.
+"""
+from alembic import op
+
+# Revision identifiers
+revision = '009_customer_status_varchar'
+down_revision = '008_bigint_transaction_ids'
+branch_labels = None
+depends_on = None
+
+STATUS_CHECK = "status IN ('ACTIVE', 'INACTIVE', 'SUSPENDED')"
+
+
+def upgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        # The enum-typed default cannot be cast with the column, so it is set again after
+        op.alter_column('customers', 'status', server_default=None)
+        op.execute("ALTER TABLE customers ALTER COLUMN status TYPE VARCHAR(16) USING status::text")
+        op.alter_column('customers', 'status', server_default='ACTIVE')
+    with op.batch_alter_table('customers') as batch_op:
+        batch_op.create_check_constraint('ck_customer_status', STATUS_CHECK)
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute("DROP TYPE customerstatus")
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute("CREATE TYPE customerstatus AS ENUM ('ACTIVE', 'INACTIVE', 'SUSPENDED')")
+    with op.batch_alter_table('customers') as batch_op:
+        batch_op.drop_constraint('ck_customer_status', type_='check')
+    if op.get_bind().dialect.name == 'postgresql':
+        op.alter_column('customers', 'status', server_default=None)
+        op.execute("ALTER TABLE customers ALTER COLUMN status TYPE customerstatus USING status::customerstatus")
+        op.alter_column('customers', 'status', server_default='ACTIVE')
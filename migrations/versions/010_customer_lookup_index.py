@@ -0,0 +1,27 @@
+"""
+Replace the customers bill_ref and msisdn indexes with one index covering the active-customer lookup.
+"""
+from alembic import op
+
+# Revision identifiers
+revision = '010_customer_lookup_index'
+down_revision = '009_customer_status_varchar'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index(
+        'ix_customers_lookup',
+        'customers',
+        ['bill_ref', 'msisdn', 'status', 'ref_type'],
+        postgresql_include=['id'],
+    )
+    op.drop_index('ix_customers_bill_ref', table_name='customers')
+    op.drop_index('ix_customers_msisdn', table_name='customers')
+
+
+def downgrade():
+    op.create_index('ix_customers_bill_ref', 'customers', ['bill_ref'])
+    op.create_index('ix_customers_msisdn', 'customers', ['msisdn'])
+    op.drop_index('ix_customers_lookup', table_name='customers')
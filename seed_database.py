@@ -3,11 +3,13 @@ Database seeding functionality for Airtel Kenya C2B IPN system.
 """
 import argparse
 import csv
+import io
 import os
 import sys
+from contextlib import contextmanager
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
 from datetime import datetime
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy import create_engine, insert
 
 # Add parent directory to path
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
@@ -16,129 +18,477 @@ from app.models.customer import Customer, CustomerStatus
 from app.models.user import User
 from app.utils.security import get_password_hash
 from app.config import DB_URL
+from app.database import engine_options
 
-def create_session():
-    """Create a database session."""
-    engine = create_engine(DB_URL)
-    Session = sessionmaker(bind=engine)
-    return Session()
+# Number of CSV rows sent to the database at a time
+BATCH_SIZE = 10_000
 
-def seed_customers(csv_file=None):
+# Bytes of CSV parsed per pyarrow block
+ARROW_BLOCK_SIZE = 4 << 20
+
+# Parsed batches queued per insert worker before parsing waits
+MAX_PENDING_BATCHES = 2
+
+# Customer columns loaded from CSV files, in COPY column order
+CUSTOMER_COLUMNS = ('bill_ref', 'ref_type', 'msisdn', 'full_name', 'email', 'id_number', 'address', 'status')
+
+# Bill reference prefix and reference type for each kind of synthetic customer
+SAMPLE_PREFIXES = (('ACC', 'ACCOUNT'), ('INV', 'INVOICE'), ('MTR', 'METER'), ('POL', 'POLICY'), ('MSI', 'MSISDN'))
+
+# bcrypt hashes of the fixed sample user passwords; regenerate with
+# RECOMPUTE_HASHES=1 python seed_database.py --users
+SEED_PASSWORD_HASHES = {
+    'admin123': '$2b$12$80pbnNjKgOOGCmiXxIkRxuzVyxntURHsr8eFlbjdsIyB4e4VnXhYG',
+    'airtel123': '$2b$12$3R9/CurGqTnz4VQ2nEa1FudKHsHhRqZWZp6WAYnFp8Yr1X5ZaWGaO',
+}
+
+# Stored status value by upper-cased CSV status, built once instead of per row
+_STATUS_VALUES = {member.name: member.value for member in CustomerStatus}
+
+# Columns every customer CSV must have; the others may be left out
+REQUIRED_CUSTOMER_COLUMNS = ('bill_ref', 'ref_type', 'msisdn', 'full_name')
+
+# Characters escaped in COPY text format fields
+_COPY_ESCAPES = str.maketrans({'\\': '\\\\', '\t': '\\t', '\n': '\\n', '\r': '\\r'})
+
+# Engine shared by all seeding steps of a run, with the application's pool and
+# bulk INSERT settings (multi-row VALUES pages on drivers without COPY);
+# connections are not pinged on checkout, as the script only holds them for
+# the length of a run
+engine = create_engine(DB_URL, **{**engine_options(DB_URL), 'pool_pre_ping': False})
+
+# Core INSERTs built once; seeding writes through connections only, with no
+# Session, and the engine's statement cache compiles each once per run
+_INSERT_CUSTOMERS = insert(Customer.__table__)
+_INSERT_USERS = insert(User.__table__)
+
+def insert_customers(conn, rows):
+    """
+    Insert a batch of customer rows.
+    
+    On PostgreSQL (psycopg2) the rows are streamed with COPY ... FROM STDIN,
+    which skips per-row statement parsing and execution; other databases get
+    a multi-row INSERT. Either way the rows are written in the connection's
+    transaction.
+    
+    Args:
+        conn (Connection): Database connection
+        rows (list): Customer rows as dicts keyed by CUSTOMER_COLUMNS
+    """
+    if conn.dialect.driver != 'psycopg2':
+        conn.execute(_INSERT_CUSTOMERS, rows)
+        return
+    
+    # COPY text format: tab-separated fields with backslash escapes, \N for NULL
+    buffer = io.StringIO()
+    for row in rows:
+        buffer.write('\t'.join(
+            '\\N' if row[column] is None else row[column].translate(_COPY_ESCAPES)
+            for column in CUSTOMER_COLUMNS
+        ))
+        buffer.write('\n')
+    buffer.seek(0)
+    
+    cursor = conn.connection.cursor()
+    try:
+        cursor.copy_expert(
+            f"COPY customers ({', '.join(CUSTOMER_COLUMNS)}) FROM STDIN",
+            buffer
+        )
+    finally:
+        cursor.close()
+
+def generate_sample_customers(n):
+    """
+    Generate synthetic customer rows for load testing.
+    
+    Customers cycle through SAMPLE_PREFIXES; bill references, phone numbers
+    and ID numbers are derived from the row number, so each row is unique.
+    
+    Args:
+        n (int): Number of customers to generate.
+    
+    Returns:
+        list: Customer rows as dicts keyed by CUSTOMER_COLUMNS
+    """
+    kinds = len(SAMPLE_PREFIXES)
+    active = CustomerStatus.ACTIVE.value
+    return [
+        {
+            'bill_ref': f"{SAMPLE_PREFIXES[i % kinds][0]}{i:06d}",
+            'ref_type': SAMPLE_PREFIXES[i % kinds][1],
+            'msisdn': f"2547{i:08d}",
+            'full_name': f"Sample Customer {i}",
+            'email': f"customer{i}@example.com",
+            'id_number': f"{i:08d}",
+            'address': "Nairobi",
+            'status': active
+        }
+        for i in range(n)
+    ]
+
+def _check_required_columns(names):
+    """
+    Check that a CSV header has every required customer column.
+    
+    Args:
+        names: Column names in the header
+    
+    Raises:
+        ValueError: If a required column is missing
+    """
+    missing = [name for name in REQUIRED_CUSTOMER_COLUMNS if name not in names]
+    if missing:
+        raise ValueError(f"CSV file is missing required column(s): {', '.join(missing)}")
+
+def read_customer_batches(f, batch_size=BATCH_SIZE):
+    """
+    Parse customer rows from an open CSV file, batch_size rows at a time.
+    
+    Args:
+        f (file): CSV file opened in text mode with newline=''.
+        batch_size (int, optional): Number of rows per batch.
+    
+    Returns:
+        Iterator[list]: Customer rows as dicts keyed by CUSTOMER_COLUMNS; none for an empty file
+    
+    Raises:
+        ValueError: If the header lacks a required column
+    """
+    # Read plain lists and look fields up by header position, instead
+    # of building a dict per row with DictReader. The file is read
+    # through the normal buffered reader: csv parsing dominates, and neither
+    # memory-mapping the file nor a larger (1 MiB) read buffer parses faster
+    reader = csv.reader(f)
+    header = next(reader, [])
+    if not header:
+        # An empty file has no rows to load
+        return
+    width = len(header)
+    position = {name: i for i, name in enumerate(header)}
+    _check_required_columns(position)
+    bill_ref, ref_type, msisdn, full_name = (
+        position[name] for name in REQUIRED_CUSTOMER_COLUMNS
+    )
+    email, id_number, address, status = (
+        position.get(name) for name in ('email', 'id_number', 'address', 'status')
+    )
+    
+    batch = []
+    for row in reader:
+        if not row:
+            continue
+        if len(row) < width:
+            # Missing trailing fields read as None, as with DictReader
+            row += [None] * (width - len(row))
+        raw_status = row[status] if status is not None else None
+        batch.append({
+            'bill_ref': row[bill_ref],
+            'ref_type': row[ref_type],
+            'msisdn': row[msisdn],
+            'full_name': row[full_name],
+            'email': row[email] if email is not None else None,
+            'id_number': row[id_number] if id_number is not None else None,
+            'address': row[address] if address is not None else None,
+            # A missing or empty status defaults to ACTIVE
+            'status': _STATUS_VALUES[raw_status.upper()] if raw_status else CustomerStatus.ACTIVE.value
+        })
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+@contextmanager
+def begin_load(unsafe_fast=False):
+    """
+    Begin a transaction for a bulk load.
+    
+    With unsafe_fast on PostgreSQL, the transaction runs with
+    session_replication_role = replica, so triggers, including the ones that
+    check foreign keys, are not fired for the loaded rows. The setting is
+    made with SET LOCAL and ends with the transaction. It needs superuser
+    rights, and rows breaking a foreign key are not caught; unique and CHECK
+    constraints are still enforced.
+    
+    Args:
+        unsafe_fast (bool, optional): Skip triggers for the transaction.
+    
+    Returns:
+        ContextManager[Connection]: Connection in the load transaction
+    """
+    with engine.begin() as conn:
+        if unsafe_fast and conn.dialect.name == 'postgresql':
+            conn.exec_driver_sql("SET LOCAL session_replication_role = replica")
+        yield conn
+
+def read_customer_batches_arrow(f, batch_size=BATCH_SIZE):
+    """
+    Parse customer rows from an open CSV file with pyarrow's CSV reader.
+    
+    Yields the same batches as read_customer_batches(), but the file is
+    split and parsed by pyarrow in native code, on multiple threads. Only
+    used when requested, so pyarrow is imported here rather than required.
+    
+    Args:
+        f (file): CSV file opened in binary mode.
+        batch_size (int, optional): Number of rows per batch.
+    
+    Returns:
+        Iterator[list]: Customer rows as dicts keyed by CUSTOMER_COLUMNS; none for an empty file
+    
+    Raises:
+        ValueError: If the header lacks a required column
+    """
+    import pyarrow as pa
+    import pyarrow.csv as pacsv
+    
+    if not f.peek(1):
+        # pyarrow rejects an empty file; it has no rows to load
+        return
+    
+    reader = pacsv.open_csv(
+        f,
+        read_options=pacsv.ReadOptions(block_size=ARROW_BLOCK_SIZE),
+        parse_options=pacsv.ParseOptions(newlines_in_values=True),
+        # Keep every field as text; empty fields stay empty strings, as with csv
+        convert_options=pacsv.ConvertOptions(column_types=dict.fromkeys(CUSTOMER_COLUMNS, pa.string())),
+    )
+    names = reader.schema.names
+    _check_required_columns(names)
+    present = [name for name in CUSTOMER_COLUMNS if name in names]
+    positions = [names.index(name) for name in present]
+    absent = dict.fromkeys(name for name in CUSTOMER_COLUMNS if name not in names)
+    
+    batch = []
+    for record_batch in reader:
+        columns = [record_batch.column(i).to_pylist() for i in positions]
+        for fields in zip(*columns):
+            row = dict(zip(present, fields), **absent)
+            raw_status = row['status']
+            # A missing or empty status defaults to ACTIVE
+            row['status'] = _STATUS_VALUES[raw_status.upper()] if raw_status else CustomerStatus.ACTIVE.value
+            batch.append(row)
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+    if batch:
+        yield batch
+
+def _flush_customer_batch(rows, unsafe_fast=False):
+    """
+    Insert and commit one batch of customer rows on its own connection.
+    
+    Args:
+        rows (list): Customer rows as dicts keyed by CUSTOMER_COLUMNS
+        unsafe_fast (bool, optional): Skip triggers for the batch.
+    
+    Returns:
+        int: Number of rows inserted
+    """
+    with begin_load(unsafe_fast) as conn:
+        insert_customers(conn, rows)
+    return len(rows)
+
+def _load_customer_batches_concurrently(batches, workers, unsafe_fast=False):
+    """
+    Insert parsed batches from worker threads while the caller keeps parsing.
+    
+    At most MAX_PENDING_BATCHES batches per worker are held in memory; the
+    parser waits for a batch to finish before reading further ahead.
+    
+    Args:
+        batches (Iterator[list]): Parsed customer batches
+        workers (int): Number of inserting threads
+        unsafe_fast (bool, optional): Skip triggers for each batch.
+    
+    Returns:
+        int: Number of rows inserted
+    """
+    inserted = 0
+    pending = set()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for batch in batches:
+            if len(pending) >= workers * MAX_PENDING_BATCHES:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                inserted += sum(future.result() for future in done)
+            pending.add(executor.submit(_flush_customer_batch, batch, unsafe_fast))
+        inserted += sum(future.result() for future in as_completed(pending))
+    return inserted
+
+def seed_customers(csv_file=None, batch_size=BATCH_SIZE, rebuild_indexes=False, workers=0, unsafe_fast=False,
+                   sample_count=None, use_arrow=False):
     """
     Seed the customers table with sample data or from a CSV file.
     
+    CSV rows are inserted in batches of batch_size, so memory use does not
+    grow with the size of the file, and committed together in a single
+    transaction, so a failed seed leaves no partial data behind.
+    
+    With workers, batches are instead inserted by that many threads, each on
+    its own pooled connection, while the main thread goes on parsing the
+    file. Each batch commits on its own, so a failed seed may leave the
+    batches before the failure in place.
+    
+    With rebuild_indexes, the non-unique indexes are dropped before a CSV
+    load and rebuilt in one pass afterwards instead of being updated row by
+    row; worthwhile for large loads into a populated table.
+    
+    With unsafe_fast, CSV rows are loaded without firing triggers; see
+    begin_load().
+    
     Args:
         csv_file (str, optional): Path to CSV file with customer data.
+        batch_size (int, optional): Number of CSV rows per INSERT batch.
+        rebuild_indexes (bool, optional): Rebuild secondary indexes around a CSV load.
+        workers (int, optional): Number of inserting threads; 0 loads in a single transaction.
+        unsafe_fast (bool, optional): Skip triggers during a CSV load.
+        sample_count (int, optional): Without a CSV file, seed this many
+            generated customers instead of the fixed sample set.
+        use_arrow (bool, optional): Parse the CSV file with pyarrow.
     """
-    session = create_session()
-    
     if csv_file and os.path.exists(csv_file):
-        # Seed from CSV file
-        with open(csv_file, 'r') as f:
-            reader = csv.DictReader(f)
-            for row in reader:
-                customer = Customer(
-                    bill_ref=row['bill_ref'],
-                    ref_type=row['ref_type'],
-                    msisdn=row['msisdn'],
-                    full_name=row['full_name'],
-                    email=row.get('email'),
-                    id_number=row.get('id_number'),
-                    address=row.get('address'),
-                    status=CustomerStatus[row.get('status', 'ACTIVE').upper()]
-                )
-                session.add(customer)
+        # Seed from CSV file; rows are inserted as plain dicts a batch at
+        # a time, without building Customer instances
+        inserted = 0
+        # Unique indexes back constraints and must stay in place during the load
+        indexes = [index for index in Customer.__table__.indexes if not index.unique] if rebuild_indexes else []
+        with open(csv_file, 'rb') if use_arrow else open(csv_file, 'r', newline='') as f:
+            if use_arrow:
+                batches = read_customer_batches_arrow(f, batch_size)
+            else:
+                batches = read_customer_batches(f, batch_size)
+            if workers > 0:
+                with engine.begin() as conn:
+                    for index in indexes:
+                        index.drop(conn, checkfirst=True)
+                try:
+                    inserted = _load_customer_batches_concurrently(batches, workers, unsafe_fast)
+                finally:
+                    with engine.begin() as conn:
+                        for index in indexes:
+                            index.create(conn, checkfirst=True)
+            else:
+                with begin_load(unsafe_fast) as conn:
+                    for index in indexes:
+                        index.drop(conn, checkfirst=True)
+                    for batch in batches:
+                        insert_customers(conn, batch)
+                        inserted += len(batch)
+                    for index in indexes:
+                        index.create(conn)
+        
+        print(f"Seeded {inserted} customers from {csv_file}")
+    elif sample_count:
+        # Seed with generated data, in batches of batch_size
+        rows = generate_sample_customers(sample_count)
+        with engine.begin() as conn:
+            for start in range(0, len(rows), batch_size):
+                insert_customers(conn, rows[start:start + batch_size])
         
-        print(f"Seeded customers from {csv_file}")
+        print(f"Seeded {len(rows)} generated customers")
     else:
-        # Seed with sample data
+        # Seed with sample data, through the same insert path as CSV rows
         sample_customers = [
-            Customer(
-                bill_ref="ACC123456",
-                ref_type="ACCOUNT",
-                msisdn="254712345678",
-                full_name="John Doe",
-                email="john.doe@example.com",
-                id_number="12345678",
-                address="123 Main St, Nairobi",
-                status=CustomerStatus.ACTIVE
-            ),
-            Customer(
-                bill_ref="INV789012",
-                ref_type="INVOICE",
-                msisdn="254723456789",
-                full_name="Jane Smith",
-                email="jane.smith@example.com",
-                id_number="87654321",
-                address="456 Park Ave, Nairobi",
-                status=CustomerStatus.ACTIVE
-            ),
-            Customer(
-                bill_ref="MTR456789",
-                ref_type="METER",
-                msisdn="254734567890",
-                full_name="Bob Johnson",
-                email="bob.johnson@example.com",
-                id_number="23456789",
-                address="789 Oak St, Nairobi",
-                status=CustomerStatus.ACTIVE
-            ),
-            Customer(
-                bill_ref="POL567890",
-                ref_type="POLICY",
-                msisdn="254745678901",
-                full_name="Alice Brown",
-                email="alice.brown@example.com",
-                id_number="34567890",
-                address="012 Pine St, Nairobi",
-                status=CustomerStatus.ACTIVE
-            ),
-            Customer(
-                bill_ref="MSI678901",
-                ref_type="MSISDN",
-                msisdn="254756789012",
-                full_name="Charlie Wilson",
-                email="charlie.wilson@example.com",
-                id_number="45678901",
-                address="345 Elm St, Nairobi",
-                status=CustomerStatus.ACTIVE
-            )
+            {
+                'bill_ref': "ACC123456",
+                'ref_type': "ACCOUNT",
+                'msisdn': "254712345678",
+                'full_name': "John Doe",
+                'email': "john.doe@example.com",
+                'id_number': "12345678",
+                'address': "123 Main St, Nairobi",
+                'status': CustomerStatus.ACTIVE.value
+            },
+            {
+                'bill_ref': "INV789012",
+                'ref_type': "INVOICE",
+                'msisdn': "254723456789",
+                'full_name': "Jane Smith",
+                'email': "jane.smith@example.com",
+                'id_number': "87654321",
+                'address': "456 Park Ave, Nairobi",
+                'status': CustomerStatus.ACTIVE.value
+            },
+            {
+                'bill_ref': "MTR456789",
+                'ref_type': "METER",
+                'msisdn': "254734567890",
+                'full_name': "Bob Johnson",
+                'email': "bob.johnson@example.com",
+                'id_number': "23456789",
+                'address': "789 Oak St, Nairobi",
+                'status': CustomerStatus.ACTIVE.value
+            },
+            {
+                'bill_ref': "POL567890",
+                'ref_type': "POLICY",
+                'msisdn': "254745678901",
+                'full_name': "Alice Brown",
+                'email': "alice.brown@example.com",
+                'id_number': "34567890",
+                'address': "012 Pine St, Nairobi",
+                'status': CustomerStatus.ACTIVE.value
+            },
+            {
+                'bill_ref': "MSI678901",
+                'ref_type': "MSISDN",
+                'msisdn': "254756789012",
+                'full_name': "Charlie Wilson",
+                'email': "charlie.wilson@example.com",
+                'id_number': "45678901",
+                'address': "345 Elm St, Nairobi",
+                'status': CustomerStatus.ACTIVE.value
+            }
         ]
         
-        for customer in sample_customers:
-            session.add(customer)
+        with engine.begin() as conn:
+            insert_customers(conn, sample_customers)
         
         print("Seeded customers with sample data")
-    
-    session.commit()
-    session.close()
 
 def seed_users():
-    """Seed the users table with sample data."""
-    session = create_session()
-    
-    # Create admin user
-    admin_user = User(
-        username="admin",
-        password_hash=get_password_hash("admin123"),
-        email="admin@example.com",
-        is_active=True
-    )
+    """
+    Seed the users table with sample data.
     
-    # Create API user
-    api_user = User(
-        username="airtel_api",
-        password_hash=get_password_hash("airtel123"),
-        email="api@example.com",
-        is_active=True
-    )
+    The sample passwords are fixed, so their hashes are precomputed in
+    SEED_PASSWORD_HASHES. With RECOMPUTE_HASHES set in the environment they
+    are hashed again instead, concurrently on a thread pool as bcrypt releases
+    the GIL while hashing, and the new hashes are printed for updating the
+    table. The users are then inserted in one statement.
+    """
+    users = [
+        # Admin user
+        {
+            'username': "admin",
+            'password': "admin123",
+            'email': "admin@example.com",
+            'is_active': True
+        },
+        # API user
+        {
+            'username': "airtel_api",
+            'password': "airtel123",
+            'email': "api@example.com",
+            'is_active': True
+        }
+    ]
     
-    session.add(admin_user)
-    session.add(api_user)
-    session.commit()
+    passwords = [user.pop('password') for user in users]
+    if os.environ.get('RECOMPUTE_HASHES'):
+        with ThreadPoolExecutor() as executor:
+            password_hashes = list(executor.map(get_password_hash, passwords))
+        for password, password_hash in zip(passwords, password_hashes):
+            print(f"{password!r}: {password_hash!r},")
+    else:
+        password_hashes = [SEED_PASSWORD_HASHES[password] for password in passwords]
+    for user, password_hash in zip(users, password_hashes):
+        user['password_hash'] = password_hash
+    
+    with engine.begin() as conn:
+        conn.execute(_INSERT_USERS, users)
     
     print("Seeded users with sample data")
-    session.close()
 
 def export_customers_template(output_file):
     """
@@ -167,18 +517,33 @@ if __name__ == "__main__":
     parser.add_argument('--users', action='store_true', help='Seed users table')
     parser.add_argument('--all', action='store_true', help='Seed all tables')
     parser.add_argument('--csv', type=str, help='CSV file with customer data')
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help='CSV rows inserted per batch')
+    parser.add_argument('--rebuild-indexes', action='store_true',
+                        help='Drop secondary customer indexes during a CSV load and rebuild them after')
+    parser.add_argument('--workers', type=int, default=0,
+                        help='Threads inserting CSV batches in parallel, each batch committed separately')
+    parser.add_argument('--unsafe-fast', action='store_true',
+                        help='Load CSV rows without firing triggers or foreign key checks (PostgreSQL, superuser)')
+    parser.add_argument('--sample-count', type=int,
+                        help='Without --csv, seed this many generated customers instead of the sample set')
+    parser.add_argument('--arrow', action='store_true', help='Parse the CSV file with pyarrow (must be installed)')
     parser.add_argument('--template', type=str, help='Export customer template to CSV file')
     
     args = parser.parse_args()
     
-    if args.template:
-        export_customers_template(args.template)
-    elif args.all:
-        seed_customers(args.csv)
-        seed_users()
-    elif args.customers:
-        seed_customers(args.csv)
-    elif args.users:
-        seed_users()
-    else:
-        parser.print_help()
+    try:
+        if args.template:
+            export_customers_template(args.template)
+        elif args.all:
+            seed_customers(args.csv, args.batch_size, args.rebuild_indexes, args.workers, args.unsafe_fast,
+                           args.sample_count, args.arrow)
+            seed_users()
+        elif args.customers:
+            seed_customers(args.csv, args.batch_size, args.rebuild_indexes, args.workers, args.unsafe_fast,
+                           args.sample_count, args.arrow)
+        elif args.users:
+            seed_users()
+        else:
+            parser.print_help()
+    finally:
+        engine.dispose()